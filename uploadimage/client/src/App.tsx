@@ -47,6 +47,11 @@ export default function App() {
     setError(null);
   };
 
+  const handleFileSelected = (selected: File) => {
+    setActiveSampleId(null);
+    assignFile(selected);
+  };
+
   const handleSampleSelect = async (sample: SampleReceipt) => {
     setActiveSampleId(sample.id);
     try {
@@ -73,10 +78,14 @@ export default function App() {
     setIsAnalyzing(true);
     setError(null);
     try {
-      const response = await fetch(`${API_BASE_URL}/analyze`, {
-        method: "POST",
-        body: formData,
-      });
+      // Samples come with a precomputed analysis, so the demo costs no LLM quota.
+      const activeSample = samples.find((sample) => sample.id === activeSampleId);
+      const response = activeSample?.has_analysis
+        ? await fetch(`${API_BASE_URL}/samples/${activeSample.id}/analysis`)
+        : await fetch(`${API_BASE_URL}/analyze`, {
+            method: "POST",
+            body: formData,
+          });
       
       if (!response.ok) {
         let errorMessage = "Analysis failed";
@@ -128,7 +137,7 @@ export default function App() {
           <p className="muted">Upload a receipt image or try one of the built-in samples.</p>
         </header>
 
-        <FileDropZone onFileSelected={assignFile} />
+        <FileDropZone onFileSelected={handleFileSelected} />
 
         <div className="panel-section">
           <div className="panel-section__header">
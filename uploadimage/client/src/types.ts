@@ -23,10 +23,15 @@ export type AnalyzeResponse = {
   raw_text?: string | null;
   ocr_text?: string | null;
   warnings: string[];
+  tier?: "ocr" | "llm" | "mixed" | null;
+  ocr_confidence?: number | null;
+  receipt_id?: number | null;
+  near_duplicate?: { distance: number; similarity: number } | null;
 };
 
 export type SampleReceipt = {
   id: string;
   label: string;
   mime_type: string;
+  has_analysis?: boolean;
 };
@@ -0,0 +1,236 @@
+"""Benchmark the OCR receipt parser against the golden corpus.
+
+Compares throughput and per-field accuracy of the current single-pass parser
+with the original multi-regex implementation (kept verbatim below):
+
+    uv run python scripts/bench_ocr_parser.py --iterations 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "server"))
+
+from app.schemas.analyze import LineItem, ReceiptData  # noqa: E402
+from app.services.ocr_parser import parse_receipt_from_ocr, parse_receipts_from_ocr  # noqa: E402
+
+CORPUS_PATH = Path(__file__).resolve().parent / "fixtures" / "ocr_golden.json"
+FIELDS = (
+    "merchant_name",
+    "merchant_address",
+    "purchase_date",
+    "subtotal",
+    "tax",
+    "total",
+    "payment_method",
+    "line_item_totals",
+)
+
+
+def legacy_parse_receipt_from_ocr(ocr_text: str) -> ReceiptData:
+    """Extract basic receipt fields from OCR text using simple pattern matching."""
+    if not ocr_text:
+        return ReceiptData()
+
+    lines = ocr_text.split("\n")
+    text = ocr_text.lower()
+
+    # Extract merchant name (usually first non-empty line)
+    merchant_name = None
+    for line in lines[:5]:  # Check first 5 lines
+        line = line.strip()
+        if line and len(line) > 2 and not re.match(r"^\d+[/-]\d+", line):  # Not a date
+            merchant_name = line
+            break
+
+    # Extract date patterns
+    purchase_date = None
+    date_patterns = [
+        r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # MM/DD/YYYY or DD/MM/YYYY
+        r"(\d{4}[/-]\d{1,2}[/-]\d{1,2})",  # YYYY-MM-DD
+    ]
+    for pattern in date_patterns:
+        match = re.search(pattern, ocr_text)
+        if match:
+            purchase_date = match.group(1)
+            break
+
+    # Extract totals (look for "total", "amount", etc.)
+    total = None
+    subtotal = None
+    tax = None
+
+    # Look for total patterns
+    total_patterns = [
+        r"total[:\s]*\$?([\d,]+\.?\d*)",
+        r"amount[:\s]*\$?([\d,]+\.?\d*)",
+        r"grand\s+total[:\s]*\$?([\d,]+\.?\d*)",
+    ]
+    for pattern in total_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            try:
+                total = float(match.group(1).replace(",", ""))
+                break
+            except ValueError:
+                pass
+
+    # Look for subtotal
+    subtotal_match = re.search(r"subtotal[:\s]*\$?([\d,]+\.?\d*)", text, re.IGNORECASE)
+    if subtotal_match:
+        try:
+            subtotal = float(subtotal_match.group(1).replace(",", ""))
+        except ValueError:
+            pass
+
+    # Look for tax
+    tax_match = re.search(r"tax[:\s]*\$?([\d,]+\.?\d*)", text, re.IGNORECASE)
+    if tax_match:
+        try:
+            tax = float(tax_match.group(1).replace(",", ""))
+        except ValueError:
+            pass
+
+    # Extract line items (lines with prices)
+    line_items: list[LineItem] = []
+    price_pattern = r"\$?([\d,]+\.?\d{2})"
+    
+    for line in lines:
+        line = line.strip()
+        if not line or len(line) < 3:
+            continue
+        
+        # Look for lines that might be items (contain price at end)
+        price_match = re.search(rf"{price_pattern}\s*$", line)
+        if price_match:
+            try:
+                price = float(price_match.group(1).replace(",", ""))
+                # Remove price from description
+                description = re.sub(rf"{price_pattern}\s*$", "", line).strip()
+                if description and price > 0:
+                    line_items.append(
+                        LineItem(
+                            description=description,
+                            quantity=None,
+                            unit_price=None,
+                            total=price,
+                        )
+                    )
+            except (ValueError, IndexError):
+                pass
+
+    # Extract payment method
+    payment_method = None
+    payment_keywords = {
+        "cash": "Cash",
+        "credit": "Credit Card",
+        "debit": "Debit Card",
+        "visa": "Visa",
+        "mastercard": "Mastercard",
+        "amex": "American Express",
+        "paypal": "PayPal",
+    }
+    for keyword, method in payment_keywords.items():
+        if keyword in text:
+            payment_method = method
+            break
+
+    # Extract address (look for common address patterns)
+    merchant_address = None
+    address_pattern = r"(\d+\s+[\w\s]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln)[\w\s,]*\d{5})"
+    address_match = re.search(address_pattern, ocr_text, re.IGNORECASE)
+    if address_match:
+        merchant_address = address_match.group(1).strip()
+
+    return ReceiptData(
+        merchant_name=merchant_name,
+        merchant_address=merchant_address,
+        purchase_date=purchase_date,
+        subtotal=subtotal,
+        tax=tax,
+        total=total,
+        payment_method=payment_method,
+        line_items=line_items[:20],  # Limit to 20 items
+        currency="RS",
+    )
+
+
+
+def load_corpus(path: Path) -> list[dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _field_matches(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, float) and isinstance(actual, (int, float)):
+        return abs(actual - expected) < 0.005
+    if isinstance(expected, str) and isinstance(actual, str):
+        return actual.strip().lower() == expected.strip().lower()
+    if isinstance(expected, list) and isinstance(actual, list):
+        return len(actual) == len(expected) and all(_field_matches(a, e) for a, e in zip(actual, expected))
+    return actual == expected
+
+
+def score(parser: Callable[[str], ReceiptData], corpus: list[dict[str, Any]]) -> dict[str, float]:
+    hits = {field: 0 for field in FIELDS}
+    for case in corpus:
+        parsed = parser(case["ocr_text"]).model_dump()
+        parsed["line_item_totals"] = [item["total"] for item in parsed["line_items"]]
+        for field in FIELDS:
+            hits[field] += _field_matches(parsed[field], case["expected"][field])
+    return {field: hits[field] / len(corpus) for field in FIELDS}
+
+
+def time_parser(parse_many: Callable[[list[str]], Any], texts: list[str], iterations: int, rounds: int) -> float:
+    """Median seconds per receipt over several rounds."""
+
+    samples: list[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            parse_many(texts)
+        samples.append((time.perf_counter() - started) / (iterations * len(texts)))
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH)
+    parser.add_argument("--iterations", type=int, default=500, help="passes over the corpus per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [case["ocr_text"] for case in corpus]
+
+    legacy_time = time_parser(
+        lambda batch: [legacy_parse_receipt_from_ocr(text) for text in batch], texts, args.iterations, args.rounds
+    )
+    current_time = time_parser(parse_receipts_from_ocr, texts, args.iterations, args.rounds)
+    legacy_accuracy = score(legacy_parse_receipt_from_ocr, corpus)
+    current_accuracy = score(parse_receipt_from_ocr, corpus)
+
+    print(f"Corpus: {len(corpus)} receipts from {args.corpus}")
+    print(f"{'':<18}{'legacy':>12}{'current':>12}")
+    print(f"{'us / receipt':<18}{legacy_time * 1e6:>12.1f}{current_time * 1e6:>12.1f}")
+    print(f"{'receipts / s':<18}{1 / legacy_time:>12.0f}{1 / current_time:>12.0f}")
+    print(f"{'speedup':<18}{'':>12}{legacy_time / current_time:>11.2f}x")
+    print()
+    print(f"{'field accuracy':<18}{'legacy':>12}{'current':>12}")
+    for field in FIELDS:
+        print(f"{field:<18}{legacy_accuracy[field]:>12.0%}{current_accuracy[field]:>12.0%}")
+    overall_legacy = sum(legacy_accuracy.values()) / len(FIELDS)
+    overall_current = sum(current_accuracy.values()) / len(FIELDS)
+    print(f"{'overall':<18}{overall_legacy:>12.0%}{overall_current:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Benchmark memory held per in-flight LLM request: streamed request bodies vs. buffered JSON.
+
+Starts ``stub_llm`` in its own process with a fixed latency so every request
+overlaps, then, in a fresh process per variant, sends ``--concurrency``
+concurrent ``GeminiClient.analyze`` calls with distinct ``--size-mb`` images
+and reports how far peak RSS rose above the baseline (payloads already
+allocated). ``buffered`` is the previous request path, kept below: the base64
+string inside the payload dict, serialized as a whole by ``json=``.
+
+    uv run python scripts/bench_payload_memory.py --size-mb 8 --concurrency 16
+    uv run python scripts/bench_payload_memory.py --provider openrouter
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+VARIANTS = ("buffered", "streamed")
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _substitute(node: Any, placeholder: str, encoded: str) -> Any:
+    if isinstance(node, dict):
+        return {key: _substitute(value, placeholder, encoded) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_substitute(value, placeholder, encoded) for value in node]
+    if isinstance(node, str):
+        return node.replace(placeholder, encoded)
+    return node
+
+
+async def measure(variant: str, *, size: int, concurrency: int) -> dict[str, Any]:
+    from app.services.gemini import GeminiClient
+    from app.services.request_body import IMAGE_PLACEHOLDER
+
+    class BufferedGeminiClient(GeminiClient):
+        @staticmethod
+        def _encode_body(payload: dict[str, Any], image_bytes: bytes) -> tuple[dict[str, str], Any]:
+            encoded = base64.b64encode(image_bytes).decode("ascii")
+            content = json.dumps(_substitute(payload, IMAGE_PLACEHOLDER, encoded)).encode("utf-8")
+            return {"Content-Type": "application/json"}, content
+
+    client = BufferedGeminiClient() if variant == "buffered" else GeminiClient()
+    # Distinct uploads, allocated before the baseline like the request bytes a worker already holds.
+    payloads = [os.urandom(size) for _ in range(concurrency)]
+    await client.warm_up()
+    baseline = peak_rss_bytes()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(client.analyze(image_bytes=data, mime_type="image/jpeg") for data in payloads), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+    errors = [str(result)[:200] for result in results if isinstance(result, BaseException)]
+    growth = peak_rss_bytes() - baseline
+    return {
+        "variant": variant,
+        "peak_rss_growth_mb": growth / 1e6,
+        "per_request_mb": growth / concurrency / 1e6,
+        "per_request_vs_image": growth / concurrency / size,
+        "seconds": elapsed,
+        "errors": errors,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"stub provider did not start on port {port}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0, help="image size per request")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--provider", choices=["google", "openrouter"], default="google")
+    parser.add_argument("--latency-ms", type=float, default=2000.0, help="stub latency; keeps requests overlapping")
+    parser.add_argument("--variant", choices=VARIANTS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", type=Path, default=None, help="write the results as JSON")
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+
+    if args.variant:
+        # Child process: the environment was prepared by the parent before any app import.
+        sys.path.insert(0, str(ROOT / "server"))
+        result = asyncio.run(measure(args.variant, size=size, concurrency=args.concurrency))
+        print(json.dumps(result))
+        return
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="stub-key",
+        LLM_PROVIDER=args.provider,
+        GOOGLE_API_BASE=f"{base}/v1beta",
+        OPENROUTER_API_BASE=f"{base}/api/v1",
+        GOOGLE_MAX_CONCURRENCY=str(args.concurrency),
+        OPENROUTER_MAX_CONCURRENCY=str(args.concurrency),
+    )
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            str(SCRIPTS_DIR / "stub_llm.py"),
+            "--port",
+            str(port),
+            "--latency-ms",
+            str(args.latency_ms),
+            "--jitter-ms",
+            "0",
+        ]
+    )
+    results = []
+    try:
+        wait_for_port(port)
+        for variant in VARIANTS:
+            command = [
+                sys.executable,
+                __file__,
+                "--variant",
+                variant,
+                "--size-mb",
+                str(args.size_mb),
+                "--concurrency",
+                str(args.concurrency),
+            ]
+            child = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{args.concurrency} concurrent {args.provider} requests with {args.size_mb:g} MB images")
+    print(f"{'variant':<10}{'peak RSS +MB':>14}{'MB/request':>12}{'x image':>9}{'seconds':>9}")
+    for result in results:
+        print(
+            f"{result['variant']:<10}{result['peak_rss_growth_mb']:>14.1f}{result['per_request_mb']:>12.2f}"
+            f"{result['per_request_vs_image']:>9.2f}{result['seconds']:>9.2f}"
+        )
+        for error in result["errors"][:3]:
+            print(f"  error: {error}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
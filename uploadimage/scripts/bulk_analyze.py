@@ -0,0 +1,215 @@
+"""Run a directory of archived receipts through the analysis pipeline, writing JSONL results.
+
+Uses the same ``ReceiptAnalyzer`` as ``POST /api/analyze`` in-process, without HTTP:
+OCR runs on its worker process pool, up to ``--concurrency`` analyses are in
+flight at once and LLM calls share the app's rate limiting and model failover.
+Settings come from ``server/.env`` and the environment:
+
+    uv run python scripts/bulk_analyze.py archive/ --output results.jsonl
+    uv run python scripts/bulk_analyze.py archive/ --output results.jsonl --concurrency 32 --ocr-workers 8
+
+Each finished file is appended to the output as one JSON line and flushed
+immediately, so the output is also the checkpoint: re-running the same command
+after an interruption skips files already recorded as ``ok`` (or ``skipped``
+as unsupported) and retries failures.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic", ".heif", ".pdf"}
+
+
+def discover(directory: Path) -> list[Path]:
+    """Receipt files below ``directory`` (recursively), in a stable order."""
+
+    return sorted(
+        path for path in directory.rglob("*") if path.is_file() and path.suffix.lower() in SUFFIXES
+    )
+
+
+def load_checkpoint(output: Path) -> set[str]:
+    """Paths already recorded in ``output`` that need no retry (``ok``, or ``skipped`` as unsupported).
+
+    A line cut short by an interrupted run is dropped, so that appending
+    continues on a clean line.
+    """
+
+    if not output.exists():
+        return set()
+    data = output.read_bytes()
+    complete = data[: data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        with output.open("r+b") as handle:
+            handle.truncate(len(complete))
+    done: set[str] = set()
+    for line in complete.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") in ("ok", "skipped"):
+            done.add(record["path"])
+    return done
+
+
+class Progress:
+    """Counts and latencies for the final report; prints a line every ``every`` files."""
+
+    def __init__(self, total: int, *, every: int) -> None:
+        self.total = total
+        self.every = max(every, 1)
+        self.statuses: Counter[str] = Counter()
+        self.tiers: Counter[str] = Counter()
+        self.latencies: list[float] = []
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def record(self, record: dict[str, Any], size: int) -> None:
+        self.statuses[record["status"]] += 1
+        self.latencies.append(record["seconds"])
+        self.bytes += size
+        tier = (record.get("result") or {}).get("tier")
+        if tier:
+            self.tiers[tier] += 1
+        done = sum(self.statuses.values())
+        if done % self.every == 0 or done == self.total:
+            elapsed = time.perf_counter() - self.started
+            print(f"{done}/{self.total} files, {done / elapsed:.1f} files/s", flush=True)
+
+    def report(self, *, skipped: int) -> None:
+        from loadtest import percentile
+
+        done = sum(self.statuses.values())
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"{done} files in {elapsed:.1f}s -> {done / elapsed:.2f} files/s, {self.bytes / elapsed / 1e6:.2f} MB/s")
+        print(f"already done: {skipped}, statuses: {dict(self.statuses)}, tiers: {dict(self.tiers)}")
+        if self.latencies:
+            quantiles = ", ".join(f"p{q} {percentile(self.latencies, q) * 1000:.0f} ms" for q in (50, 95, 99))
+            print(f"per file: {quantiles}")
+
+
+async def analyze_file(analyzer: Any, path: Path, *, relative: str, max_bytes: int) -> tuple[dict[str, Any], int]:
+    from app.services.uploads import sniff_mime_type
+
+    started = time.perf_counter()
+    record: dict[str, Any] = {"path": relative}
+    size = 0
+    try:
+        data = await asyncio.to_thread(path.read_bytes)
+        size = len(data)
+        mime_type = sniff_mime_type(data[:16])
+        if not data or size > max_bytes or mime_type is None:
+            record.update(status="skipped", error="empty, too large or not a supported image/PDF")
+        else:
+            digest = hashlib.sha256(data).hexdigest()
+            result = await analyzer.analyze(contents=data, mime_type=mime_type, digest=digest)
+            # A result without parsed data is retried on the next run, like an error.
+            record.update(
+                status="ok" if result.parsed is not None else "failed",
+                sha256=digest,
+                result=result.model_dump(mode="json", exclude_none=True),
+            )
+    except Exception as exc:
+        record.update(status="error", error=f"{type(exc).__name__}: {str(exc)[:200]}")
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record, size
+
+
+async def run(
+    directory: Path, output: Path, *, concurrency: int, limit: Optional[int], progress_every: int
+) -> int:
+    from app.core.config import get_settings
+    from app.services.analyzer import ReceiptAnalyzer
+
+    files = discover(directory)
+    done = load_checkpoint(output)
+    pending = [path for path in files if path.relative_to(directory).as_posix() not in done]
+    skipped = len(files) - len(pending)
+    if limit is not None:
+        pending = pending[:limit]
+    print(f"{len(files)} receipts found, {skipped} already done, {len(pending)} to analyze", flush=True)
+    if not pending:
+        return 0
+
+    analyzer = ReceiptAnalyzer()
+    max_bytes = get_settings().max_upload_bytes
+    progress = Progress(len(pending), every=progress_every)
+    queue = iter(pending)
+    try:
+        await analyzer.warm_up()
+        progress.started = time.perf_counter()
+        with output.open("a", encoding="utf-8") as out:
+
+            async def worker() -> None:
+                # Pull the next path only when free, so at most `concurrency` files are held in memory.
+                for path in queue:
+                    relative = path.relative_to(directory).as_posix()
+                    record, size = await analyze_file(analyzer, path, relative=relative, max_bytes=max_bytes)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    progress.record(record, size)
+
+            await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    finally:
+        await analyzer.aclose()
+        progress.report(skipped=skipped)
+    return 1 if progress.statuses["error"] or progress.statuses["failed"] else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path, help="directory of receipt images/PDFs (searched recursively)")
+    parser.add_argument("--output", type=Path, required=True, help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=16, help="analyses in flight at once")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="OCR processes (default: OCR_WORKERS)")
+    parser.add_argument(
+        "--mode", choices=["llm_first", "ocr_first"], default=None, help="EXTRACTION_MODE for this run"
+    )
+    parser.add_argument(
+        "--llm-rpm", type=float, default=None, help="LLM_REQUESTS_PER_MINUTE for this run (0: unlimited)"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="analyze at most this many pending files")
+    parser.add_argument("--progress-every", type=int, default=100, help="print progress every N files")
+    args = parser.parse_args()
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+    # Settings are cached on first use, so the environment must be in place before importing the app.
+    overrides = {
+        "OCR_WORKERS": args.ocr_workers,
+        "EXTRACTION_MODE": args.mode,
+        "LLM_REQUESTS_PER_MINUTE": args.llm_rpm,
+    }
+    os.environ.update({name: str(value) for name, value in overrides.items() if value is not None})
+    sys.path.insert(0, str(ROOT / "server"))
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    sys.exit(
+        asyncio.run(
+            run(
+                args.directory.resolve(),
+                args.output,
+                concurrency=args.concurrency,
+                limit=args.limit,
+                progress_every=args.progress_every,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
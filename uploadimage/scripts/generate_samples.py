@@ -39,14 +39,17 @@ RECEIPTS = {
 }
 
 
-def render_receipt(lines: list[str], path: Path) -> None:
-    width, height = 900, 1200
+def render_receipt(lines: list[str], path: Path, size: tuple[int, int] = (900, 1200)) -> None:
+    width, height = size
     image = Image.new("RGB", (width, height), "white")
     draw = ImageDraw.Draw(image)
-    y = 40
+    # Keep the original 900x1200 layout proportions at any resolution.
+    scale = width / 900
+    font = FONT if scale <= 1 else ImageFont.load_default(size=int(11 * scale))
+    y = int(40 * scale)
     for line in lines:
-        draw.text((40, y), line, font=FONT, fill="black")
-        y += 40
+        draw.text((int(40 * scale), y), line, font=font, fill="black")
+        y += int(40 * scale)
     image.save(path)
 
 
@@ -0,0 +1,340 @@
+"""Offline load test for ``POST /api/analyze`` against a stub LLM provider.
+
+Generates a receipt corpus, starts ``stub_llm`` on a local port, points the
+FastAPI app at it and drives the app with concurrent clients, then reports
+latency percentiles and throughput overall and per pipeline stage (the
+latter estimated from the app's ``receipt_stage_duration_seconds`` histograms):
+
+    uv run python scripts/loadtest.py --requests 500 --concurrency 32 --latency-ms 800
+    uv run python scripts/loadtest.py --provider openrouter --resolution 3024x4032 --output result.json
+
+No Gemini quota is used. Exits non-zero when ``--max-p95-ms`` is exceeded so it
+can gate a deploy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+ITEMS = [
+    ("Bananas", 0.59),
+    ("Milk 2%", 3.49),
+    ("Bread", 2.99),
+    ("Eggs dozen", 4.19),
+    ("Coffee beans", 11.99),
+    ("Paper towels", 6.49),
+    ("Olive oil", 8.79),
+    ("Screen Replacement", 179.99),
+    ("Labor (1.5h)", 90.00),
+]
+
+
+def random_receipt_lines(rng: random.Random) -> list[str]:
+    lines = [
+        rng.choice(["WALMART SUPERCENTER", "CORNER CAFE", "ACE HARDWARE", "CITY PHARMACY"]),
+        f"{rng.randint(1, 9999)} Elm Street",
+        "Austin, TX 78701",
+        f"Date: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "------------------------------",
+    ]
+    subtotal = 0.0
+    for name, price in rng.sample(ITEMS, rng.randint(2, 6)):
+        quantity = rng.randint(1, 3)
+        subtotal += quantity * price
+        lines.append(f"{name:<14}{quantity} @ {price:.2f}  {quantity * price:>8.2f}")
+    tax = round(subtotal * 0.0825, 2)
+    lines += [
+        f"Subtotal {subtotal:>20.2f}",
+        f"Sales Tax {tax:>19.2f}",
+        f"TOTAL {subtotal + tax:>23.2f}",
+        f"Paid with {rng.choice(['VISA', 'MasterCard', 'Cash'])}",
+    ]
+    return lines
+
+
+def generate_corpus(directory: Path, size: int, resolution: tuple[int, int], fmt: str, seed: int) -> list[Path]:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from generate_samples import render_receipt
+
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(size):
+        path = directory / f"receipt_{index:04d}.{fmt}"
+        render_receipt(random_receipt_lines(rng), path, size=resolution)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile; q in [0, 100]."""
+
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Run a uvicorn server on a background thread for the duration of a with-block."""
+
+    def __init__(self, app: Any, port: int) -> None:
+        import uvicorn
+
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "ServerThread":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+_STAGE_SAMPLE_RE = re.compile(r"^receipt_stage_duration_seconds_(bucket|sum|count)\{(.*)\} (\S+)$")
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class StageHistogram:
+    """One stage's ``receipt_stage_duration_seconds`` histogram, summed over workers."""
+
+    def __init__(self) -> None:
+        self.buckets: dict[float, float] = defaultdict(float)
+        self.sum = 0.0
+        self.count = 0.0
+
+    def minus(self, earlier: Optional["StageHistogram"]) -> "StageHistogram":
+        if earlier is None:
+            return self
+        delta = StageHistogram()
+        for bound, cumulative in self.buckets.items():
+            delta.buckets[bound] = cumulative - earlier.buckets.get(bound, 0.0)
+        delta.sum = self.sum - earlier.sum
+        delta.count = self.count - earlier.count
+        return delta
+
+    def percentile(self, q: float) -> float:
+        """Estimate like PromQL's histogram_quantile: linear within the bucket holding the rank."""
+
+        if not self.count:
+            return math.nan
+        rank = q / 100 * self.count
+        lower, below = 0.0, 0.0
+        for bound, cumulative in sorted(self.buckets.items()):
+            if cumulative >= rank:
+                if math.isinf(bound):
+                    return lower
+                if cumulative == below:
+                    return bound
+                return lower + (bound - lower) * (rank - below) / (cumulative - below)
+            lower, below = bound, cumulative
+        return lower
+
+
+def parse_stage_histograms(text: str) -> dict[str, StageHistogram]:
+    """Per-stage histograms from a ``/metrics`` exposition."""
+
+    stages: dict[str, StageHistogram] = defaultdict(StageHistogram)
+    for line in text.splitlines():
+        match = _STAGE_SAMPLE_RE.match(line)
+        if match is None:
+            continue
+        kind, raw_labels, value = match.groups()
+        labels = dict(_LABEL_RE.findall(raw_labels))
+        histogram = stages[labels.get("stage", "")]
+        if kind == "bucket":
+            histogram.buckets[float(labels["le"])] += float(value)
+        elif kind == "sum":
+            histogram.sum += float(value)
+        else:
+            histogram.count += float(value)
+    return dict(stages)
+
+
+async def drive(app: Any, corpus: list[Path], *, requests: int, concurrency: int) -> dict[str, Any]:
+    import httpx
+
+    payloads = [(path.name, path.read_bytes()) for path in corpus]
+    latencies: list[float] = []
+    status_counts: dict[str, int] = defaultdict(int)
+    degraded = 0
+    next_index = 0
+
+    async def client(http: httpx.AsyncClient) -> None:
+        nonlocal next_index, degraded
+        while next_index < requests:
+            name, data = payloads[next_index % len(payloads)]
+            next_index += 1
+            mime = "image/png" if name.endswith(".png") else "image/jpeg"
+            started = time.perf_counter()
+            response = await http.post("/api/analyze", files={"file": (name, data, mime)})
+            latencies.append(time.perf_counter() - started)
+            status_counts[str(response.status_code)] += 1
+            if response.status_code == 200 and response.json().get("warnings"):
+                degraded += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as http:
+            # Stage timings come from the app's own histograms, as the run's difference of two scrapes.
+            before = parse_stage_histograms((await http.get("/metrics")).text)
+            started = time.perf_counter()
+            await asyncio.gather(*(client(http) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            after = parse_stage_histograms((await http.get("/metrics")).text)
+
+    stages = {stage: histogram.minus(before.get(stage)) for stage, histogram in after.items()}
+    return {
+        "latencies": latencies,
+        "elapsed": elapsed,
+        "status_counts": dict(status_counts),
+        "degraded": degraded,
+        "stages": {stage: histogram for stage, histogram in stages.items() if histogram.count},
+    }
+
+
+def summarize_histogram(histogram: StageHistogram) -> dict[str, float]:
+    """Like ``summarize``, with percentiles estimated from the histogram buckets."""
+
+    return {
+        "count": int(histogram.count),
+        "mean_ms": histogram.sum / histogram.count * 1000 if histogram.count else math.nan,
+        "p50_ms": histogram.percentile(50) * 1000,
+        "p95_ms": histogram.percentile(95) * 1000,
+        "p99_ms": histogram.percentile(99) * 1000,
+    }
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else math.nan,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def main() -> None:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from stub_llm import add_stub_arguments, create_stub_app, stub_config_from_args
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--provider", choices=["google", "openrouter"], default="google")
+    parser.add_argument("--corpus-size", type=int, default=20)
+    parser.add_argument("--corpus-dir", type=Path, default=None, help="reuse or keep the generated corpus here")
+    parser.add_argument("--resolution", default="900x1200", help="WIDTHxHEIGHT of generated receipts")
+    parser.add_argument("--format", choices=["png", "jpeg"], default="jpeg")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache enabled")
+    parser.add_argument("--no-ocr", action="store_true", help="disable the OCR fallback")
+    parser.add_argument(
+        "--llm-rpm", type=float, default=0, help="LLM_REQUESTS_PER_MINUTE for the app (default 0: unlimited)"
+    )
+    parser.add_argument(
+        "--hedge", action="store_true", help="enable LLM hedging (the stub serves both providers)"
+    )
+    parser.add_argument("--output", type=Path, default=None, help="write the summary as JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail when overall p95 exceeds this")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    width, height = (int(part) for part in args.resolution.lower().split("x"))
+    corpus_dir = args.corpus_dir or Path(tempfile.mkdtemp(prefix="receipt-corpus-"))
+    corpus = sorted(corpus_dir.glob(f"*.{args.format}")) if args.corpus_dir else []
+    if len(corpus) < args.corpus_size:
+        corpus = generate_corpus(corpus_dir, args.corpus_size, (width, height), args.format, args.seed or 0)
+    corpus = corpus[: args.corpus_size]
+
+    stub_port = free_port()
+    stub_base = f"http://127.0.0.1:{stub_port}"
+    # Stub results must never reach the real shared cache, job queue or receipt store.
+    state_dir = Path(tempfile.mkdtemp(prefix="receipt-loadtest-state-"))
+    # Settings are cached on first use, so the environment must be in place before importing the app.
+    os.environ.update(
+        {
+            "GEMINI_API_KEY": "stub-key",
+            "LLM_PROVIDER": args.provider,
+            "GOOGLE_API_BASE": f"{stub_base}/v1beta",
+            "OPENROUTER_API_BASE": f"{stub_base}/api/v1",
+            "ENABLE_RESULT_CACHE": str(args.cache).lower(),
+            "ENABLE_OCR_FALLBACK": str(not args.no_ocr).lower(),
+            "LLM_REQUESTS_PER_MINUTE": str(args.llm_rpm),
+            "ENABLE_LLM_HEDGING": str(args.hedge).lower(),
+            "OPENROUTER_API_KEY": "stub-key",
+            "ENABLE_RECEIPT_STORE": "false",
+            "SHARED_STATE_PATH": str(state_dir / "shared_state.sqlite3"),
+            "JOBS_DB_PATH": str(state_dir / "jobs.sqlite3"),
+            "RECEIPT_STORE_PATH": str(state_dir / "receipts.sqlite3"),
+        }
+    )
+    sys.path.insert(0, str(ROOT / "server"))
+    from app.main import app
+
+    with ServerThread(create_stub_app(stub_config_from_args(args)), stub_port):
+        run = asyncio.run(drive(app, corpus, requests=args.requests, concurrency=args.concurrency))
+
+    summary = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "provider": args.provider,
+            "resolution": args.resolution,
+            "format": args.format,
+            "stub_latency_ms": args.latency_ms,
+            "stub_error_rate": args.error_rate,
+            "stub_rate_limit_rate": args.rate_limit_rate,
+            "stub_stall_rate": args.stall_rate,
+            "hedge": args.hedge,
+        },
+        "requests_per_second": len(run["latencies"]) / run["elapsed"],
+        "status_counts": run["status_counts"],
+        "degraded_responses": run["degraded"],
+        "overall": summarize(run["latencies"]),
+        "stages": {stage: summarize_histogram(histogram) for stage, histogram in sorted(run["stages"].items())},
+    }
+
+    print(f"{len(run['latencies'])} requests in {run['elapsed']:.2f}s -> {summary['requests_per_second']:.1f} req/s")
+    print(f"status codes: {run['status_counts']}, responses with warnings: {run['degraded']}")
+    print(f"{'stage':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in [("overall", summary["overall"]), *summary["stages"].items()]:
+        print(f"{stage:<12}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    if args.max_p95_ms is not None and summary["overall"]["p95_ms"] > args.max_p95_ms:
+        print(f"FAIL: p95 {summary['overall']['p95_ms']:.1f} ms exceeds {args.max_p95_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
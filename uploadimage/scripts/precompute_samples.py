@@ -0,0 +1,72 @@
+"""Analyze the bundled sample receipts once and store the results for the samples API.
+
+Uses the provider configured in ``server/.env``. Each result is written to
+``server/samples/precomputed/<sample id>.json`` and served by
+``GET /api/samples/{id}/analysis``, so the demo spends no quota:
+
+    uv run python scripts/precompute_samples.py            # only samples without a result
+    uv run python scripts/precompute_samples.py --force    # re-analyze everything
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+async def precompute(names: list[str], *, force: bool) -> int:
+    from app.routes.samples import PRECOMPUTED_DIR, build_index
+    from app.services.analyzer import ReceiptAnalyzer
+
+    index = build_index()
+    unknown = [name for name in names if name not in index.samples]
+    if unknown:
+        print(f"Unknown samples: {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    PRECOMPUTED_DIR.mkdir(parents=True, exist_ok=True)
+    analyzer = ReceiptAnalyzer()
+    failures = 0
+    try:
+        for sample in index.samples.values():
+            if names and sample.id not in names:
+                continue
+            target = PRECOMPUTED_DIR / f"{sample.id}.json"
+            if target.exists() and not force:
+                print(f"Skipped {sample.id} (already precomputed)")
+                continue
+            result = await analyzer.analyze(contents=sample.path.read_bytes(), mime_type=sample.mime_type)
+            if result.parsed is None:
+                # Don't freeze a failed analysis into the demo.
+                failures += 1
+                print(f"Failed {sample.id}: {'; '.join(result.warnings)}", file=sys.stderr)
+                continue
+            target.write_text(result.model_dump_json(indent=2) + "\n", encoding="utf-8")
+            suffix = f" ({len(result.warnings)} warnings)" if result.warnings else ""
+            print(f"Wrote {target.relative_to(ROOT)}{suffix}")
+    finally:
+        await analyzer.aclose()
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("samples", nargs="*", help="sample ids to analyze (default: all)")
+    parser.add_argument("--force", action="store_true", help="overwrite existing results")
+    args = parser.parse_args()
+
+    # Always ask the provider rather than a locally cached result, and keep the
+    # demo samples (and a receipt_id) out of the user's receipt store.
+    os.environ["ENABLE_RESULT_CACHE"] = "false"
+    os.environ["ENABLE_RECEIPT_STORE"] = "false"
+    sys.path.insert(0, str(ROOT / "server"))
+    sys.exit(asyncio.run(precompute(args.samples, force=args.force)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Local stand-in for the Gemini and OpenRouter APIs, for offline benchmarking.
+
+Serves the Gemini REST ``models/{model}:generateContent`` and
+``:streamGenerateContent`` endpoints and the OpenAI-compatible
+``/chat/completions`` endpoint used by OpenRouter (and by Gemini's own OpenAI
+compatibility layer), answering with a canned receipt after a configurable
+delay and failing a configurable share of requests. Streaming responses send
+the first chunk after ``--first-token-ratio`` of the latency and spread the
+rest over the remainder:
+
+    uv run python scripts/stub_llm.py --port 9100 --latency-ms 800 --error-rate 0.02
+
+Point the server at it with ``GOOGLE_API_BASE=http://127.0.0.1:9100/v1beta``
+or ``OPENROUTER_API_BASE=http://127.0.0.1:9100/api/v1``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+CANNED_RECEIPT: dict[str, Any] = {
+    "merchant_name": "WALMART SUPERCENTER",
+    "merchant_address": "123 Elm Street, Austin, TX",
+    "purchase_date": "2024-08-16",
+    "subtotal": 7.66,
+    "tax": 0.56,
+    "total": 8.22,
+    "payment_method": "Visa",
+    "currency": "USD",
+    "line_items": [
+        {"description": "Bananas", "quantity": 2, "unit_price": 0.59, "total": 1.18},
+        {"description": "Milk 2%", "quantity": 1, "unit_price": 3.49, "total": 3.49},
+        {"description": "Bread", "quantity": 1, "unit_price": 2.99, "total": 2.99},
+    ],
+    "additional_fields": {},
+}
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 500.0
+    jitter_ms: float = 100.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_ms: float = 30000.0
+    retry_after_seconds: int = 2
+    fenced: bool = True
+    stream_chunks: int = 12
+    first_token_ratio: float = 0.2
+    seed: int | None = None
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Stub LLM provider")
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def completion_text(structured: bool) -> str:
+        # Like the real providers, a requested response schema rules out Markdown fences.
+        body = json.dumps(CANNED_RECEIPT)
+        return f"```json\n{body}\n```" if config.fenced and not structured else body
+
+    async def simulate(share: float = 1.0) -> float:
+        """Sleep for ``share`` of a sampled latency and maybe fail; returns the unslept remainder."""
+
+        stats["requests"] += 1
+        delay = max(rng.gauss(config.latency_ms, config.jitter_ms), 0.0) / 1000
+        if rng.random() < config.stall_rate:
+            delay = config.stall_ms / 1000
+        await asyncio.sleep(delay * share)
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Resource has been exhausted (e.g. check quota).",
+                headers={"Retry-After": str(config.retry_after_seconds)},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            raise HTTPException(status_code=500, detail="Stub provider failure")
+        return delay * (1 - share)
+
+    async def stream_completion(
+        remaining: float, wrap: Callable[[str], dict[str, Any]], *, structured: bool, done: bool
+    ) -> AsyncIterator[str]:
+        text = completion_text(structured)
+        count = max(config.stream_chunks, 1)
+        size = -(-len(text) // count)
+        for index in range(0, len(text), size):
+            if index:
+                await asyncio.sleep(remaining / count)
+            yield f"data: {json.dumps(wrap(text[index : index + size]))}\n\n"
+        if done:
+            yield "data: [DONE]\n\n"
+
+    @app.post("/v1beta/models/{model_action}")
+    async def google_generate(model_action: str, request: Request) -> Response:
+        model, _, action = model_action.partition(":")
+        if action not in ("generateContent", "streamGenerateContent"):
+            raise HTTPException(status_code=404, detail=f"Unsupported action: {action}")
+        payload = await request.json()
+        structured = (payload.get("generationConfig") or {}).get("responseMimeType") == "application/json"
+        if action == "streamGenerateContent":
+            remaining = await simulate(config.first_token_ratio)
+            return StreamingResponse(
+                stream_completion(
+                    remaining,
+                    lambda chunk: {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}]},
+                    structured=structured,
+                    done=False,
+                ),
+                media_type="text/event-stream",
+            )
+        await simulate()
+        return JSONResponse(
+            {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": completion_text(structured)}]}}],
+                "modelVersion": model,
+            }
+        )
+
+    async def chat_completions(request: Request) -> Response:
+        payload = await request.json()
+        structured = "response_format" in payload
+        if payload.get("stream"):
+            remaining = await simulate(config.first_token_ratio)
+            return StreamingResponse(
+                stream_completion(
+                    remaining,
+                    lambda chunk: {"choices": [{"index": 0, "delta": {"content": chunk}}]},
+                    structured=structured,
+                    done=True,
+                ),
+                media_type="text/event-stream",
+            )
+        await simulate()
+        return JSONResponse(
+            {
+                "id": f"stub-{stats['requests']}",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": completion_text(structured)},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+        )
+
+    app.add_api_route("/api/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1beta/openai/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    def get_stats() -> dict[str, int]:
+        return dict(stats)
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=StubConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=StubConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate, help="share of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=StubConfig.rate_limit_rate, help="share of 429s")
+    parser.add_argument("--stall-rate", type=float, default=StubConfig.stall_rate, help="share of stalled calls")
+    parser.add_argument("--stall-ms", type=float, default=StubConfig.stall_ms, help="latency of a stalled call")
+    parser.add_argument("--first-token-ratio", type=float, default=StubConfig.first_token_ratio)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        first_token_ratio=args.first_token_ratio,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(stub_config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
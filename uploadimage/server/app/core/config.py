@@ -5,19 +5,81 @@ from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
 
 class Settings(BaseSettings):
     """Application configuration driven by environment variables."""
 
     gemini_api_key: str | None = None
     gemini_model: str = "gemini-2.0-flash"  # Try 2.0-flash which may have different quota limits
+    gemini_fallback_models: str = ""
     llm_provider: Literal["google", "openrouter"] = "google"
+    llm_structured_output: bool = True
+    # Separate OpenRouter key; when set, GEMINI_API_KEY is always the Google key.
+    openrouter_api_key: str | None = None
+    enable_llm_hedging: bool = False
+    llm_hedge_model: str | None = None
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_delay_seconds: float = 1.0
+    llm_hedge_initial_delay_seconds: float = 5.0
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_cooldown_seconds: float = 30.0
     enable_ocr_fallback: bool = True
+    ocr_mode: Literal["serial", "concurrent"] = "serial"
+    ocr_on_success: bool = False
+    ocr_workers: int = 2
+    extraction_mode: Literal["llm_first", "ocr_first"] = "llm_first"
+    ocr_confidence_threshold: float = 0.9
     allowed_origins_raw: str = "http://localhost:5173"
     openrouter_api_base: str = "https://openrouter.ai/api/v1"
+    google_api_base: str = "https://generativelanguage.googleapis.com/v1beta"
     request_timeout_seconds: int = 60
+    google_max_concurrency: int = 32
+    openrouter_max_concurrency: int = 32
+    llm_requests_per_minute: float = 60
+    llm_burst: int = 10
+    llm_queue_timeout_seconds: float = 10.0
+    llm_quota_cooldown_seconds: float = 30.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
     client_app_title: str = "Gemini Receipt Analyzer"
     client_app_url: str | None = "http://localhost:5173"
+    max_upload_bytes: int = 20 * 1024 * 1024
+    enable_preprocessing: bool = True
+    preprocess_max_edge: int = 2048
+    preprocess_grayscale: bool = True
+    preprocess_format: Literal["jpeg", "webp", "png"] = "jpeg"
+    preprocess_quality: int = 85
+    pdf_render_dpi: int = 150
+    pdf_page_concurrency: int = 4
+    pdf_max_pages: int = 50
+    # Per worker process; ANALYZE_MAX_IN_FLIGHT=0 disables admission control.
+    analyze_max_in_flight: int = 16
+    analyze_max_queue: int = 32
+    analyze_queue_timeout_seconds: float = 5.0
+    analyze_retry_after_seconds: int = 5
+    batch_max_files: int = 500
+    batch_max_total_bytes: int = 512 * 1024 * 1024
+    batch_max_concurrency: int = 8
+    jobs_db_path: str = str(DATA_DIR / "jobs.sqlite3")
+    jobs_workers: int = 4
+    jobs_max_pending: int = 10000
+    jobs_retention_seconds: int = 24 * 3600
+    jobs_lease_seconds: float = 60.0
+    jobs_poll_interval_seconds: float = 1.0
+    # Opt-in: /api/receipts has no authentication, so anyone who can reach the server can read saved receipts.
+    enable_receipt_store: bool = False
+    receipt_store_path: str = str(DATA_DIR / "receipts.sqlite3")
+    enable_result_cache: bool = True
+    result_cache_max_entries: int = 256
+    result_cache_dir: str | None = None
+    # Shared by all workers on the host; set to an empty value to keep caches and rate limits per process.
+    shared_state_path: str | None = str(DATA_DIR / "shared_state.sqlite3")
+    shared_cache_max_entries: int = 10000
+    enable_near_duplicate_reuse: bool = False
+    near_duplicate_max_distance: int = 8
+    near_duplicate_max_entries: int = 10000
 
     _root = Path(__file__).resolve().parents[2]
     model_config = SettingsConfigDict(
@@ -26,6 +88,37 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    @property
+    def model_chain(self) -> list[str]:
+        """Primary model followed by the fallbacks, tried in order as quota runs out."""
+        models = [self.gemini_model]
+        for model in self.gemini_fallback_models.split(","):
+            model = model.strip()
+            if model and model not in models:
+                models.append(model)
+        return models
+
+    @property
+    def hedge_provider(self) -> Literal["google", "openrouter"]:
+        return "openrouter" if self.llm_provider == "google" else "google"
+
+    @property
+    def hedge_model(self) -> str:
+        """Model used on the hedge provider; OpenRouter namespaces Google's models under ``google/``."""
+        if self.llm_hedge_model:
+            return self.llm_hedge_model
+        if self.hedge_provider == "openrouter":
+            return f"google/{self.gemini_model}"
+        return self.gemini_model.removeprefix("google/")
+
+    def api_key_for(self, provider: str) -> str | None:
+        if provider == "openrouter":
+            return self.openrouter_api_key or (self.gemini_api_key if self.llm_provider == "openrouter" else None)
+        # Without a separate OpenRouter key, GEMINI_API_KEY belongs to whichever provider is selected.
+        if self.llm_provider == "google" or self.openrouter_api_key:
+            return self.gemini_api_key
+        return None
+
     @property
     def allowed_origins(self) -> list[str]:
         return [origin.strip() for origin in self.allowed_origins_raw.split(",") if origin.strip()]
@@ -0,0 +1,97 @@
+"""ASGI middleware shared by the application."""
+
+from __future__ import annotations
+
+from starlette.datastructures import MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import start_request_timings
+
+
+class _BodyTooLarge(HTTPException):
+    def __init__(self, limit: int) -> None:
+        super().__init__(status_code=413, detail=f"Request body exceeds the {limit // (1024 * 1024)} MB limit")
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies larger than the limit before they are buffered.
+
+    Multipart parsing spools the whole body before a route runs, so this is
+    the only place an oversized upload can be turned away without buffering it.
+    A declared Content-Length over the limit is refused straight away; bodies
+    without one (chunked) are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, *, max_body_bytes: int, overrides: dict[str, int] | None = None) -> None:
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.overrides = overrides or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.overrides.get(scope["path"], self.max_body_bytes)
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await self._reject(_BodyTooLarge(limit), scope, receive, send)
+                    return
+                break
+
+        received = 0
+        response_started = False
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this normally becomes the 413 response.
+                    raise _BodyTooLarge(limit)
+            return message
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_tracked)
+        except _BodyTooLarge as exc:
+            if response_started:
+                raise
+            await self._reject(exc, scope, receive, send)
+
+    @staticmethod
+    async def _reject(exc: _BodyTooLarge, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+        await response(scope, receive, send)
+
+
+class ServerTimingMiddleware:
+    """Collect pipeline stage timings for each request and report them in a Server-Timing header."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_request_timings()
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                value = timings.header_value()
+                if value:
+                    MutableHeaders(scope=message).append("Server-Timing", value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_timings)
@@ -1,24 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.core.config import get_settings
-from app.routes import analyze, samples
+from app.core.middleware import BodySizeLimitMiddleware, ServerTimingMiddleware
+from app.routes import analyze, jobs, receipts, samples
+from app.services.metrics import REGISTRY
 
 settings = get_settings()
-app = FastAPI(title="Gemini Receipt Analyzer", version="0.1.0")
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await samples.startup()
+    await jobs.startup()
+    # Warm up in the background: the server answers /health right away and
+    # /ready flips once provider connections and OCR workers are up.
+    warm_up = asyncio.create_task(analyze.warm_up())
+    yield
+    warm_up.cancel()
+    await jobs.shutdown()
+    await analyze.shutdown()
+
+
+app = FastAPI(title="Gemini Receipt Analyzer", version="0.1.0", lifespan=lifespan)
+
+app.add_middleware(ServerTimingMiddleware)
+# Leave room for multipart boundaries and headers on top of the file itself.
+_MULTIPART_OVERHEAD = 64 * 1024
+_MULTIPART_PART_OVERHEAD = 1024
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_bytes=settings.max_upload_bytes + _MULTIPART_OVERHEAD,
+    overrides={
+        "/api/analyze/batch": settings.batch_max_total_bytes
+        + _MULTIPART_OVERHEAD
+        + _MULTIPART_PART_OVERHEAD * settings.batch_max_files,
+    },
+)
+# Added last so it sits outermost and rejections still carry CORS headers.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins,
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["Server-Timing"],
 )
 
 app.include_router(analyze.router)
+app.include_router(jobs.router)
+app.include_router(receipts.router)
 app.include_router(samples.router)
 
 
 @app.get("/health")
 def health_check() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def readiness_check() -> JSONResponse:
+    ready, checks = analyze.readiness()
+    return JSONResponse({"status": "ready" if ready else "not_ready", "checks": checks}, status_code=200 if ready else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
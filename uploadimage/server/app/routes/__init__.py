@@ -1 +1 @@
-from . import analyze, samples  # noqa: F401
+from . import analyze, jobs, receipts, samples  # noqa: F401
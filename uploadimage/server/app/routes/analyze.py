@@ -1,35 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional
+
 from fastapi import APIRouter, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
 
+from app.core.config import get_settings
 from app.schemas.analyze import AnalyzeResponse
+from app.services.admission import AdmissionController, AdmissionRejected
 from app.services.analyzer import ReceiptAnalyzer
+from app.services.metrics import timed
+from app.services.uploads import SpooledUpload, UploadRejected, read_upload, spool_upload
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["analysis"])
-_analyzer = ReceiptAnalyzer()
+# Built on first use (or by the warm-up), so importing the app has no side effects.
+_analyzer: Optional[ReceiptAnalyzer] = None
+_admission: Optional[AdmissionController] = None
+_warm_up_state = "pending"
 
 
-@router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_document(file: UploadFile = File(...)) -> AnalyzeResponse:
-    if file.size is not None and file.size == 0:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty")
-    
-    if not file.content_type or not file.content_type.startswith(("image/", "application/pdf")):
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Unsupported file type: {file.content_type}. Please upload an image (PNG, JPG) or PDF."
+def get_analyzer() -> ReceiptAnalyzer:
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = ReceiptAnalyzer()
+    return _analyzer
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        settings = get_settings()
+        _admission = AdmissionController(
+            max_in_flight=settings.analyze_max_in_flight,
+            max_queue=settings.analyze_max_queue,
+            queue_timeout=settings.analyze_queue_timeout_seconds,
+            retry_after=settings.analyze_retry_after_seconds,
         )
-    
+    return _admission
+
+
+async def warm_up() -> None:
+    """Pre-open provider connections and start OCR workers; tracked by the readiness check."""
+
+    global _warm_up_state
     try:
-        result = await _analyzer.process(file)
-        return result
+        await get_analyzer().warm_up()
     except Exception as exc:
-        # Return a proper response even on error, with error in warnings
-        error_message = str(exc)
-        return AnalyzeResponse(
-            parsed=None,
-            raw_text=None,
-            ocr_text=None,
-            warnings=[f"Analysis failed: {error_message}"]
-        )
+        logger.exception("Analyzer warm-up failed")
+        _warm_up_state = f"failed: {str(exc)[:200]}"
+    else:
+        _warm_up_state = "done"
+
+
+def readiness() -> tuple[bool, dict[str, str]]:
+    checks = {
+        "warm_up": _warm_up_state,
+        "llm": "configured" if get_analyzer().llm_configured else "GEMINI_API_KEY is not configured",
+    }
+    return _warm_up_state == "done" and checks["llm"] == "configured", checks
+
+
+async def shutdown() -> None:
+    if _analyzer is not None:
+        await _analyzer.aclose()
+
+
+def _failed_response(exc: Exception) -> AnalyzeResponse:
+    # Return a proper response even on error, with error in warnings
+    return AnalyzeResponse(
+        parsed=None,
+        raw_text=None,
+        ocr_text=None,
+        warnings=[f"Analysis failed: {exc}"]
+    )
+
+
+@router.post("/analyze", response_model=AnalyzeResponse)
+async def analyze_document(file: UploadFile = File(...)) -> Response:
+    try:
+        async with get_admission().slot():
+            result = await get_analyzer().process(file)
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+    except UploadRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail) from exc
+    except Exception as exc:
+        result = _failed_response(exc)
+    finally:
+        await file.close()
+
+    # Serialize here rather than in FastAPI so the cost shows up as its own stage.
+    with timed("serialize"):
+        body = result.model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/analyze/stream")
+async def analyze_stream(file: UploadFile = File(...)) -> StreamingResponse:
+    """Stream ``field`` and ``line_item`` events as the LLM extracts them, ending with ``result``."""
+
+    try:
+        upload = await read_upload(file, max_bytes=get_settings().max_upload_bytes)
+    except UploadRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail) from exc
     finally:
         await file.close()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in get_analyzer().stream(
+                contents=upload.data, mime_type=upload.mime_type, digest=upload.sha256
+            ):
+                if isinstance(data, AnalyzeResponse):
+                    yield f"event: {event}\ndata: {data.model_dump_json()}\n\n"
+                else:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as exc:
+            yield f"event: result\ndata: {_failed_response(exc).model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(files: list[UploadFile] = File(...)) -> StreamingResponse:
+    """Analyze many uploads, streaming one NDJSON line per receipt in completion order."""
+
+    settings = get_settings()
+    if len(files) > settings.batch_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files: {len(files)}. A batch accepts at most {settings.batch_max_files}.",
+        )
+
+    # FastAPI closes the uploads as soon as this handler returns, before the
+    # response body is streamed, so each one is copied to a temporary file and
+    # only loaded into memory when its analysis starts.
+    uploads: list[tuple[int, Optional[str], SpooledUpload | UploadRejected]] = []
+    total_bytes = 0
+    try:
+        for index, file in enumerate(files):
+            try:
+                upload: SpooledUpload | UploadRejected = await spool_upload(
+                    file, max_bytes=settings.max_upload_bytes
+                )
+            except UploadRejected as exc:
+                upload = exc
+            finally:
+                await file.close()
+            uploads.append((index, file.filename, upload))
+            if isinstance(upload, SpooledUpload):
+                total_bytes += upload.size
+                if total_bytes > settings.batch_max_total_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Batch exceeds the {settings.batch_max_total_bytes // (1024 * 1024)} MB total limit",
+                    )
+    except BaseException:
+        _close_uploads(uploads)
+        raise
+
+    return StreamingResponse(
+        _stream_batch(uploads, concurrency=settings.batch_max_concurrency),
+        media_type="application/x-ndjson",
+    )
+
+
+def _close_uploads(uploads: list[tuple[int, Optional[str], SpooledUpload | UploadRejected]]) -> None:
+    for _, _, upload in uploads:
+        if isinstance(upload, SpooledUpload):
+            upload.close()
+
+
+async def _stream_batch(
+    uploads: list[tuple[int, Optional[str], SpooledUpload | UploadRejected]], *, concurrency: int
+) -> AsyncIterator[str]:
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(index: int, filename: Optional[str], upload: SpooledUpload | UploadRejected) -> str:
+        if isinstance(upload, UploadRejected):
+            result = AnalyzeResponse(warnings=[upload.detail])
+        else:
+            async with semaphore:
+                try:
+                    loaded = await asyncio.to_thread(upload.read)
+                    result = await get_analyzer().analyze(
+                        contents=loaded.data, mime_type=loaded.mime_type, digest=loaded.sha256
+                    )
+                except Exception as exc:
+                    result = _failed_response(exc)
+                finally:
+                    upload.close()
+        line = {"index": index, "filename": filename, "result": result.model_dump(mode="json")}
+        return json.dumps(line) + "\n"
+
+    tasks = [asyncio.create_task(run(*upload)) for upload in uploads]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client may disconnect mid-stream; don't leave analyses running for nobody.
+        for task in tasks:
+            task.cancel()
+        _close_uploads(uploads)
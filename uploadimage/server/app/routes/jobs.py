@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+from app.routes.analyze import get_analyzer
+from app.schemas.jobs import JobResponse
+from app.services.jobs import JobManager, JobQueueFull
+from app.services.uploads import UploadRejected, read_upload
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+_manager: Optional[JobManager] = None
+
+# Seconds between SSE keep-alive comments while a job is waiting or running.
+_SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _jobs() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(get_analyzer())
+    return _manager
+
+
+async def startup() -> None:
+    await _jobs().start()
+
+
+async def shutdown() -> None:
+    if _manager is not None:
+        await _manager.stop()
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(file: UploadFile = File(...)) -> JobResponse:
+    try:
+        upload = await read_upload(file, max_bytes=get_settings().max_upload_bytes)
+    except UploadRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail) from exc
+    finally:
+        await file.close()
+
+    try:
+        return await _jobs().submit(contents=upload.data, mime_type=upload.mime_type, filename=upload.filename)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "30"}) from exc
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str) -> JobResponse:
+    job = await _jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str) -> StreamingResponse:
+    """Server-sent events: one event per status change, ending once the job is done or failed."""
+
+    job = await _jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        current = job
+        yield f"event: {current.status}\ndata: {current.model_dump_json()}\n\n"
+        while current.status not in ("done", "failed"):
+            updated = await _jobs().wait_for_update(job_id, current.updated_at, _SSE_KEEPALIVE_SECONDS)
+            if updated is None:
+                return
+            if updated.updated_at == current.updated_at:
+                yield ": keep-alive\n\n"
+                continue
+            current = updated
+            yield f"event: {current.status}\ndata: {current.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
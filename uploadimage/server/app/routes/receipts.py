@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+
+from app.routes.analyze import get_analyzer
+from app.schemas.receipts import SpendingDimension, SpendingTotal, StoredReceipt
+from app.services.receipt_store import ReceiptStore
+
+router = APIRouter(prefix="/api", tags=["receipts"])
+
+
+def _store() -> ReceiptStore:
+    store = get_analyzer().receipts
+    if store is None:
+        raise HTTPException(status_code=404, detail="The receipt store is disabled (set ENABLE_RECEIPT_STORE=true)")
+    return store
+
+
+@router.get("/receipts", response_model=list[StoredReceipt])
+async def list_receipts(
+    q: Optional[str] = Query(None, description="Words that must all appear in a line-item description"),
+    merchant: Optional[str] = Query(None, description="Merchant name, ignoring case and spacing"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+) -> list[StoredReceipt]:
+    """Saved receipts matching every given filter, newest purchase date first."""
+
+    return await asyncio.to_thread(
+        _store().search,
+        query=q,
+        merchant=merchant,
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None,
+        min_total=min_total,
+        max_total=max_total,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/receipts/summary", response_model=list[SpendingTotal])
+async def spending_summary(
+    by: SpendingDimension = "merchant",
+    currency: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+) -> list[SpendingTotal]:
+    """Receipt count and total spend per merchant, month or payment method, one row per currency."""
+
+    return await asyncio.to_thread(_store().totals, by, currency=currency, limit=limit)
+
+
+@router.get("/receipts/{receipt_id}", response_model=StoredReceipt)
+async def get_receipt(receipt_id: int) -> StoredReceipt:
+    receipt = await asyncio.to_thread(_store().get, receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
+
+
+@router.delete("/receipts/{receipt_id}", status_code=204)
+async def delete_receipt(receipt_id: int) -> Response:
+    if not await asyncio.to_thread(_store().delete, receipt_id):
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return Response(status_code=204)
@@ -1,37 +1,157 @@
 from __future__ import annotations
 
+import hashlib
 import mimetypes
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
+from typing import Any, Optional
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 
 SAMPLES_DIR = Path(__file__).resolve().parents[2] / "samples"
+# Written by scripts/precompute_samples.py as <sample id>.json.
+PRECOMPUTED_DIR = SAMPLES_DIR / "precomputed"
 
 router = APIRouter(prefix="/api", tags=["samples"])
 
 
-@router.get("/samples")
-def list_samples() -> list[dict[str, str]]:
-    samples: list[dict[str, str]] = []
-    for file_path in sorted(SAMPLES_DIR.glob("*")):
+@dataclass(frozen=True)
+class Sample:
+    id: str
+    label: str
+    mime_type: str
+    path: Path
+    etag: str
+    last_modified: float
+    analysis: Optional[bytes] = None
+    analysis_etag: Optional[str] = None
+    analysis_last_modified: Optional[float] = None
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "mime_type": self.mime_type,
+            "has_analysis": self.analysis is not None,
+        }
+
+
+@dataclass(frozen=True)
+class SampleIndex:
+    samples: dict[str, Sample]
+    etag: str
+    last_modified: float
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def build_index(directory: Path = SAMPLES_DIR) -> SampleIndex:
+    """Hash and describe every sample once; samples only change on redeploy."""
+
+    samples: dict[str, Sample] = {}
+    for file_path in sorted(directory.glob("*")):
         if not file_path.is_file():
             continue
         mime, _ = mimetypes.guess_type(file_path.name)
-        samples.append(
-            {
-                "id": file_path.name,
-                "label": file_path.stem.replace("_", " ").title(),
-                "mime_type": mime or "application/octet-stream",
-            }
+        analysis_path = PRECOMPUTED_DIR / f"{file_path.name}.json"
+        analysis = analysis_path.read_bytes() if analysis_path.is_file() else None
+        samples[file_path.name] = Sample(
+            id=file_path.name,
+            label=file_path.stem.replace("_", " ").title(),
+            mime_type=mime or "application/octet-stream",
+            path=file_path,
+            etag=_etag(file_path.read_bytes()),
+            last_modified=file_path.stat().st_mtime,
+            analysis=analysis,
+            analysis_etag=_etag(analysis) if analysis is not None else None,
+            analysis_last_modified=analysis_path.stat().st_mtime if analysis is not None else None,
         )
-    return samples
+    listing_key = "\0".join(f"{s.etag}:{s.analysis_etag}" for s in samples.values()).encode()
+    # The listing reports has_analysis, so adding, regenerating or deleting an analysis must move it forward too.
+    mtimes = [s.last_modified for s in samples.values()]
+    mtimes += [s.analysis_last_modified for s in samples.values() if s.analysis_last_modified is not None]
+    if PRECOMPUTED_DIR.is_dir():
+        mtimes.append(PRECOMPUTED_DIR.stat().st_mtime)
+    return SampleIndex(samples=samples, etag=_etag(listing_key), last_modified=max(mtimes, default=0.0))
 
 
-@router.get("/samples/{sample_id}")
-def download_sample(sample_id: str) -> FileResponse:
-    file_path = SAMPLES_DIR / sample_id
-    if not file_path.exists():
+_index: Optional[SampleIndex] = None
+
+
+def get_index() -> SampleIndex:
+    global _index
+    if _index is None:
+        _index = build_index()
+    return _index
+
+
+async def startup() -> None:
+    get_index()
+
+
+def _validators(etag: str, last_modified: float) -> dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def _not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2).
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _get_sample(sample_id: str) -> Sample:
+    sample = get_index().samples.get(sample_id)
+    if sample is None:
         raise HTTPException(status_code=404, detail="Sample not found")
-    mime, _ = mimetypes.guess_type(file_path.name)
-    return FileResponse(path=file_path, media_type=mime, filename=file_path.name)
+    return sample
+
+
+@router.get("/samples")
+def list_samples(request: Request) -> Response:
+    index = get_index()
+    headers = _validators(index.etag, index.last_modified)
+    if _not_modified(request, index.etag, index.last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse([sample.summary() for sample in index.samples.values()], headers=headers)
+
+
+@router.get("/samples/{sample_id}")
+def download_sample(sample_id: str, request: Request) -> Response:
+    sample = _get_sample(sample_id)
+    headers = _validators(sample.etag, sample.last_modified)
+    if _not_modified(request, sample.etag, sample.last_modified):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=sample.path, media_type=sample.mime_type, filename=sample.id, headers=headers)
+
+
+@router.get("/samples/{sample_id}/analysis")
+def sample_analysis(sample_id: str, request: Request) -> Response:
+    """Serve the precomputed AnalyzeResponse for a sample, so the demo spends no LLM quota."""
+
+    sample = _get_sample(sample_id)
+    if sample.analysis is None or sample.analysis_etag is None or sample.analysis_last_modified is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No precomputed analysis for this sample. Run scripts/precompute_samples.py.",
+        )
+    headers = _validators(sample.analysis_etag, sample.analysis_last_modified)
+    if _not_modified(request, sample.analysis_etag, sample.analysis_last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=sample.analysis, media_type="application/json", headers=headers)
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Literal
 from pydantic import BaseModel, Field
 
 
@@ -17,13 +17,28 @@ class ReceiptData(BaseModel):
     tax: float | None = None
     total: float | None = None
     payment_method: str | None = None
-    currency: str | None = "RS"
+    currency: str | None = None
     line_items: list[LineItem] = Field(default_factory=list)
     additional_fields: dict[str, Any] = Field(default_factory=dict)
 
 
+class NearDuplicateMatch(BaseModel):
+    distance: int = Field(..., description="Differing bits between the perceptual hashes")
+    similarity: float = Field(..., examples=[0.97], description="1 - distance / hash bits")
+
+
 class AnalyzeResponse(BaseModel):
     parsed: ReceiptData | None = None
     raw_text: str | None = None
     ocr_text: str | None = None
     warnings: list[str] = Field(default_factory=list)
+    tier: Literal["ocr", "llm", "mixed"] | None = Field(
+        None, description="Which extraction tier produced `parsed`; `mixed` for PDFs whose pages differ"
+    )
+    ocr_confidence: float | None = Field(
+        None, examples=[0.9], description="Consistency score of the OCR-parsed receipt, when one was computed"
+    )
+    receipt_id: int | None = Field(None, description="Id of the saved receipt under `/api/receipts`, once stored")
+    near_duplicate: NearDuplicateMatch | None = Field(
+        None, description="Set when the result was reused from a previously analyzed, visually similar image"
+    )
@@ -0,0 +1,17 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+from app.schemas.analyze import AnalyzeResponse
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: JobStatus
+    filename: str | None = None
+    created_at: float
+    updated_at: float
+    result: AnalyzeResponse | None = None
+    error: str | None = None
@@ -0,0 +1,27 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from app.schemas.analyze import ReceiptData
+
+SpendingDimension = Literal["merchant", "month", "payment_method"]
+
+
+class StoredReceipt(BaseModel):
+    id: int
+    sha256: str
+    created_at: float
+    tier: Literal["ocr", "llm", "mixed"] | None = None
+    date: str | None = Field(None, examples=["2024-03-05"], description="`purchase_date` as an ISO date, if parseable")
+    receipt: ReceiptData
+
+
+class SpendingTotal(BaseModel):
+    dimension: SpendingDimension
+    key: str | None = Field(
+        None, examples=["2024-03"], description="Merchant, `YYYY-MM` month or payment method; null when unknown"
+    )
+    label: str | None = Field(None, description="Display form of the key, as last seen on a receipt")
+    currency: str
+    receipt_count: int
+    total: float
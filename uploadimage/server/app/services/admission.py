@@ -0,0 +1,99 @@
+"""Admission control for synchronous analyses: bounded concurrency, a short wait queue, early rejection."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, observe_stage
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Server is busy ({reason.replace('_', ' ')}); retry in {retry_after}s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Lets at most ``max_in_flight`` analyses run at once, in arrival order.
+
+    Up to ``max_queue`` further requests wait for a slot, each for at most
+    ``queue_timeout`` seconds. Anything beyond that is rejected straight away,
+    so a burst costs the client a fast ``503`` instead of a slow timeout.
+    ``max_in_flight <= 0`` admits everything.
+    """
+
+    def __init__(self, *, max_in_flight: int, max_queue: int, queue_timeout: float, retry_after: int) -> None:
+        self._max_in_flight = max_in_flight
+        self._max_queue = max(max_queue, 0)
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if needed; raises AdmissionRejected when none comes in time."""
+
+        if self._max_in_flight <= 0 or (self._in_flight < self._max_in_flight and not self._waiters):
+            self._in_flight += 1
+            self._publish()
+            return
+        if len(self._waiters) >= self._max_queue:
+            self._reject("queue_full")
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait((waiter,), timeout=self._queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away while queued; hand back a slot that was already passed on.
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+                self._publish()
+            raise
+        finally:
+            observe_stage("admission", time.perf_counter() - started)
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            self._publish()
+            self._reject("queue_timeout")
+
+    def release(self) -> None:
+        # The slot passes straight to the oldest waiter, so in_flight only drops when nobody is queued.
+        if self._waiters:
+            self._waiters.popleft().set_result(None)
+        else:
+            self._in_flight -= 1
+        self._publish()
+
+    def _reject(self, reason: str) -> None:
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        raise AdmissionRejected(reason, self._retry_after)
+
+    def _publish(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self._in_flight)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
-import tempfile
+import asyncio
+import logging
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
 
 from fastapi import UploadFile
 
 from app.core.config import get_settings
-from app.schemas.analyze import AnalyzeResponse, ReceiptData
-from app.services.gemini import GeminiClient
+from app.schemas.analyze import AnalyzeResponse, NearDuplicateMatch, ReceiptData
+from app.services.cache import AnalysisCache, CachedAnalysis, build_cache_key, hash_bytes
+from app.services.gemini import GeminiClient, LLMStream
+from app.services.hedging import CircuitBreaker, HedgedLLM, Route
+from app.services.json_stream import ReceiptStreamParser
+from app.services.metrics import CACHE_LOOKUPS, EXTRACTION_TIERS, FALLBACKS, observe_stage, timed
+from app.services.near_duplicates import HASH_BITS, NearDuplicateIndex, dhash_bytes
 from app.services.ocr import OCRService
-from app.services.ocr_parser import parse_receipt_from_ocr
+from app.services.ocr_parser import parse_receipt_from_ocr, receipt_confidence
+from app.services.pdf import PAGE_MIME_TYPE, PDF_MIME_TYPE, iter_pdf_pages, merge_page_results, pdf_available
+from app.services.preprocess import ImagePreprocessor, PreprocessedImage
+from app.services.receipt_store import ReceiptStore
+from app.services.scheduler import ModelScheduler
+from app.services.shared_state import SharedStateStore
+from app.services.uploads import read_upload
+
+logger = logging.getLogger(__name__)
 
 
 def _coerce_receipt(payload: dict) -> ReceiptData:
@@ -22,19 +37,227 @@ class ReceiptAnalyzer:
         self._settings = get_settings()
         self._gemini = GeminiClient()
         self._ocr = OCRService()
+        self._preprocessor = ImagePreprocessor()
+        self._shared: Optional[SharedStateStore] = None
+        if self._settings.shared_state_path:
+            self._shared = SharedStateStore(
+                Path(self._settings.shared_state_path),
+                cache_max_entries=self._settings.shared_cache_max_entries,
+            )
+        self._scheduler = ModelScheduler(
+            self._settings.model_chain,
+            rate_per_minute=self._settings.llm_requests_per_minute,
+            burst=self._settings.llm_burst,
+            max_wait=self._settings.llm_queue_timeout_seconds,
+            default_cooldown=self._settings.llm_quota_cooldown_seconds,
+            store=self._shared,
+        )
+        self._hedged: Optional[HedgedLLM] = None
+        if self._settings.enable_llm_hedging:
+            self._hedged = self._build_hedged()
+        self._cache: Optional[AnalysisCache] = None
+        if self._settings.enable_result_cache:
+            cache_dir = self._settings.result_cache_dir
+            self._cache = AnalysisCache(
+                max_entries=self._settings.result_cache_max_entries,
+                directory=Path(cache_dir) if cache_dir else None,
+                shared=self._shared,
+            )
+        self._receipts: Optional[ReceiptStore] = None
+        if self._settings.enable_receipt_store:
+            self._receipts = ReceiptStore(Path(self._settings.receipt_store_path))
+        self._near_duplicates: Optional[NearDuplicateIndex] = None
+        if self._settings.enable_near_duplicate_reuse:
+            self._near_duplicates = NearDuplicateIndex(
+                max_distance=self._settings.near_duplicate_max_distance,
+                max_entries=self._settings.near_duplicate_max_entries,
+                # Results from another model, prompt or preprocessing setup are not reused.
+                context=build_cache_key(
+                    image_digest="near-duplicate",
+                    provider=self._settings.llm_provider,
+                    model=self._settings.gemini_model,
+                    prompt=self._gemini.prompt_signature,
+                    preprocessing=self._preprocessor.signature,
+                ),
+                store=self._shared,
+            )
+
+    def _build_hedged(self) -> HedgedLLM:
+        s = self._settings
+
+        def breaker(provider: str) -> CircuitBreaker:
+            return CircuitBreaker(
+                provider, failure_threshold=s.llm_breaker_failure_threshold, cooldown=s.llm_breaker_cooldown_seconds
+            )
+
+        routes = [Route(self._gemini, self._scheduler, breaker(s.llm_provider))]
+        secondary = GeminiClient(provider=s.hedge_provider)
+        if secondary.configured:
+            scheduler = ModelScheduler(
+                [s.hedge_model],
+                rate_per_minute=s.llm_requests_per_minute,
+                burst=s.llm_burst,
+                max_wait=s.llm_queue_timeout_seconds,
+                default_cooldown=s.llm_quota_cooldown_seconds,
+                store=self._shared,
+            )
+            routes.append(Route(secondary, scheduler, breaker(s.hedge_provider)))
+        else:
+            logger.warning(
+                "LLM hedging is enabled but %s has no API key; only the circuit breaker applies", s.hedge_provider
+            )
+        return HedgedLLM(
+            routes,
+            percentile=s.llm_hedge_percentile,
+            min_delay=s.llm_hedge_min_delay_seconds,
+            initial_delay=s.llm_hedge_initial_delay_seconds,
+        )
+
+    async def _call_llm(self, image: PreprocessedImage) -> tuple[CachedAnalysis, bool]:
+        """The analysis, and whether the primary provider and model produced it (only those are cached)."""
+
+        async def call(client: GeminiClient, model: str) -> tuple[CachedAnalysis, bool]:
+            value = await client.analyze(image_bytes=image.data, mime_type=image.mime_type, model=model)
+            return value, self._is_primary(client.provider, model)
+
+        if self._hedged is not None:
+            return await self._hedged.run(call)
+        return await self._scheduler.run(lambda model: call(self._gemini, model))
+
+    def _is_primary(self, provider: str, model: str) -> bool:
+        # Keys are built from the primary provider and model; a fallback's answer must not be served as theirs.
+        return provider == self._settings.llm_provider and model == self._settings.gemini_model
+
+    async def _preprocess(self, *, contents: bytes, mime_type: str) -> PreprocessedImage:
+        with timed("preprocess"):
+            image = await asyncio.to_thread(self._preprocessor.process, image_bytes=contents, mime_type=mime_type)
+        if "decode" in image.timings:
+            observe_stage("image_decode", image.timings["decode"])
+        return image
+
+    def _cache_key(self, *, contents: bytes, digest: Optional[str]) -> str:
+        return build_cache_key(
+            image_digest=digest or hash_bytes(contents),
+            provider=self._settings.llm_provider,
+            model=self._settings.gemini_model,
+            prompt=self._gemini.prompt_signature,
+            preprocessing=self._preprocessor.signature,
+        )
+
+    async def _fingerprint(self, image: PreprocessedImage, contents: bytes) -> Optional[int]:
+        if image.fingerprint is not None:
+            return image.fingerprint
+        # Preprocessing was skipped, so nothing has decoded the upload yet.
+        return await asyncio.to_thread(dhash_bytes, contents)
+
+    async def _find_near_duplicate(
+        self, fingerprint: Optional[int]
+    ) -> Optional[tuple[CachedAnalysis, NearDuplicateMatch]]:
+        if self._near_duplicates is None or fingerprint is None:
+            return None
+        hit = await asyncio.to_thread(self._near_duplicates.lookup, fingerprint)
+        if hit is None:
+            return None
+        CACHE_LOOKUPS.inc(result="near_duplicate_hit")
+        match = NearDuplicateMatch(distance=hit.distance, similarity=round(1 - hit.distance / HASH_BITS, 4))
+        return hit.value, match
+
+    async def _analyze_with_llm(
+        self, *, contents: bytes, mime_type: str, digest: Optional[str], near_duplicates: bool
+    ) -> tuple[CachedAnalysis, Optional[NearDuplicateMatch]]:
+        key = self._cache_key(contents=contents, digest=digest) if self._cache is not None else None
+        image: Optional[PreprocessedImage] = None
+        fingerprint: Optional[int] = None
+        if self._near_duplicates is not None and near_duplicates:
+            # The near-duplicate lookup needs the decoded image, so preprocess
+            # before (rather than inside) the exact-match cache computation.
+            cached = await self._cache.get(key) if self._cache is not None and key is not None else None
+            if cached is not None:
+                return cached, None
+            image = await self._preprocess(contents=contents, mime_type=mime_type)
+            fingerprint = await self._fingerprint(image, contents)
+            reused = await self._find_near_duplicate(fingerprint)
+            if reused is not None:
+                return reused
+
+        async def compute() -> tuple[CachedAnalysis, bool]:
+            prepared = image or await self._preprocess(contents=contents, mime_type=mime_type)
+            value, primary = await self._call_llm(prepared)
+            if primary and self._near_duplicates is not None and fingerprint is not None:
+                await asyncio.to_thread(self._near_duplicates.add, fingerprint, value)
+            return value, primary
+
+        if self._cache is None or key is None:
+            return (await compute())[0], None
+        return await self._cache.get_or_compute(key, compute), None
+
+    async def aclose(self) -> None:
+        for client in self._llm_clients:
+            await client.aclose()
+        self._ocr.shutdown()
+        if self._shared is not None:
+            self._shared.close()
+        if self._receipts is not None:
+            self._receipts.close()
+
+    @property
+    def _llm_clients(self) -> list[GeminiClient]:
+        if self._hedged is None:
+            return [self._gemini]
+        return [route.client for route in self._hedged.routes]
+
+    @property
+    def llm_configured(self) -> bool:
+        return self._gemini.configured
+
+    async def warm_up(self) -> None:
+        """Pre-open the provider connection and start the OCR workers concurrently."""
+
+        tasks = [client.warm_up() for client in self._llm_clients]
+        if self._settings.enable_ocr_fallback:
+            tasks.append(self._ocr.warm_up())
+        await asyncio.gather(*tasks)
 
     async def process(self, file: UploadFile) -> AnalyzeResponse:
-        contents = await file.read()
+        """Read, validate and analyze an upload; raises UploadRejected for bad files."""
+
+        upload = await read_upload(file, max_bytes=self._settings.max_upload_bytes)
+        return await self.analyze(contents=upload.data, mime_type=upload.mime_type, digest=upload.sha256)
+
+    @property
+    def receipts(self) -> Optional[ReceiptStore]:
+        return self._receipts
+
+    async def analyze(self, *, contents: bytes, mime_type: str, digest: Optional[str] = None) -> AnalyzeResponse:
+        """Analyze an image or PDF and save the parsed receipt to the receipt store."""
+
+        if mime_type == PDF_MIME_TYPE:
+            result = await self._analyze_pdf(contents)
+        else:
+            result = await self._analyze_image(contents=contents, mime_type=mime_type, digest=digest)
+        return await self._store(result, contents=contents, digest=digest)
+
+    async def _analyze_image(
+        self, *, contents: bytes, mime_type: str, digest: Optional[str] = None, near_duplicates: bool = True
+    ) -> AnalyzeResponse:
+        ocr_text, ocr_confidence, served = await self._try_ocr_tier(contents)
+        if served is not None:
+            return served
+
         warnings: list[str] = []
 
         raw_text: Optional[str] = None
         receipt: Optional[ReceiptData] = None
         gemini_failed = False
-        
+
+        ocr_future = self._start_ocr(contents) if ocr_text is None else None
+
+        near_duplicate: Optional[NearDuplicateMatch] = None
+
         # Try Gemini first
         try:
-            raw_text, parsed = self._gemini.analyze(
-                image_bytes=contents, mime_type=file.content_type or "application/octet-stream"
+            (raw_text, parsed), near_duplicate = await self._analyze_with_llm(
+                contents=contents, mime_type=mime_type, digest=digest, near_duplicates=near_duplicates
             )
             receipt = _coerce_receipt(parsed)
         except Exception as exc:  # pragma: no cover - runtime safety
@@ -42,26 +265,270 @@ class ReceiptAnalyzer:
             error_msg = str(exc)
             warnings.append(f"Gemini analysis failed: {error_msg[:200]}")
 
-        # Always try OCR as fallback, especially if Gemini failed
-        ocr_text: Optional[str] = None
-        if self._settings.enable_ocr_fallback and self._ocr.available:
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(contents)
-                tmp_path = Path(tmp.name)
+        return await self._finish(
+            contents=contents,
+            raw_text=raw_text,
+            receipt=receipt,
+            warnings=warnings,
+            gemini_failed=gemini_failed,
+            ocr_future=ocr_future,
+            near_duplicate=near_duplicate,
+            ocr_text=ocr_text,
+            ocr_confidence=ocr_confidence,
+        )
+
+    async def stream(
+        self, *, contents: bytes, mime_type: str, digest: Optional[str] = None
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Analyze an image, yielding ``field`` and ``line_item`` events while the LLM generates.
+
+        The last event is always ``("result", AnalyzeResponse)``. PDFs, cached
+        images, near-duplicates and receipts served by the OCR tier skip
+        straight to the result.
+        """
+
+        if mime_type == PDF_MIME_TYPE:
+            yield "result", await self._store(await self._analyze_pdf(contents), contents=contents, digest=digest)
+            return
+
+        ocr_text, ocr_confidence, served = await self._try_ocr_tier(contents)
+        if served is not None:
+            yield "result", await self._store(served, contents=contents, digest=digest)
+            return
+
+        key: Optional[str] = None
+        cached: Optional[CachedAnalysis] = None
+        if self._cache is not None:
+            key = self._cache_key(contents=contents, digest=digest)
+            cached = await self._cache.get(key)
+
+        warnings: list[str] = []
+        raw_text: Optional[str] = None
+        receipt: Optional[ReceiptData] = None
+        gemini_failed = False
+        near_duplicate: Optional[NearDuplicateMatch] = None
+
+        ocr_future = self._start_ocr(contents) if ocr_text is None else None
+        try:
             try:
-                ocr_text = self._ocr.read_text(file_path=tmp_path)
-                
-                # If Gemini failed and we have OCR text, try to parse it
-                if gemini_failed and ocr_text and not receipt:
-                    try:
-                        receipt = parse_receipt_from_ocr(ocr_text)
-                        if receipt.merchant_name or receipt.total:
-                            warnings.append("Using OCR-based parsing as Gemini quota was exceeded.")
-                    except Exception as parse_exc:
-                        warnings.append(f"OCR parsing failed: {str(parse_exc)[:100]}")
-            finally:
-                tmp_path.unlink(missing_ok=True)
-        elif self._settings.enable_ocr_fallback:
+                fingerprint: Optional[int] = None
+                if cached is None:
+                    image = await self._preprocess(contents=contents, mime_type=mime_type)
+                    if self._near_duplicates is not None:
+                        fingerprint = await self._fingerprint(image, contents)
+                        reused = await self._find_near_duplicate(fingerprint)
+                        if reused is not None:
+                            cached, near_duplicate = reused
+                if cached is None:
+                    # Streams can't be hedged: claim one provider whose circuit lets the call through.
+                    claim = self._hedged.claim() if self._hedged is not None else nullcontext()
+                    async with claim as route:
+                        client = route.client if route is not None else self._gemini
+                        scheduler = route.scheduler if route is not None else self._scheduler
+
+                        async def open_stream(model: str) -> tuple[LLMStream, str]:
+                            opened = await client.open_stream(
+                                image_bytes=image.data, mime_type=image.mime_type, model=model
+                            )
+                            return opened, model
+
+                        llm_stream, model = await scheduler.run(open_stream)
+                        parser = ReceiptStreamParser()
+                        chunks: list[str] = []
+                        try:
+                            async for delta in llm_stream.text():
+                                chunks.append(delta)
+                                for event in parser.feed(delta):
+                                    yield event
+                        finally:
+                            await llm_stream.aclose()
+                        cached = self._gemini.parse_response("".join(chunks))
+                    if self._is_primary(client.provider, model):
+                        if self._cache is not None and key is not None:
+                            await self._cache.put(key, cached)
+                        if self._near_duplicates is not None and fingerprint is not None:
+                            await asyncio.to_thread(self._near_duplicates.add, fingerprint, cached)
+                raw_text, parsed = cached
+                receipt = _coerce_receipt(parsed)
+            except Exception as exc:  # pragma: no cover - runtime safety
+                gemini_failed = True
+                warnings.append(f"Gemini analysis failed: {str(exc)[:200]}")
+
+            result = await self._finish(
+                contents=contents,
+                raw_text=raw_text,
+                receipt=receipt,
+                warnings=warnings,
+                gemini_failed=gemini_failed,
+                ocr_future=ocr_future,
+                near_duplicate=near_duplicate,
+                ocr_text=ocr_text,
+                ocr_confidence=ocr_confidence,
+            )
+        finally:
+            # The client may disconnect mid-stream.
+            if ocr_future is not None:
+                ocr_future.cancel()
+        yield "result", await self._store(result, contents=contents, digest=digest)
+
+    async def _store(self, result: AnalyzeResponse, *, contents: bytes, digest: Optional[str]) -> AnalyzeResponse:
+        # Near-duplicates are the same receipt uploaded again; saving them would count it twice.
+        if self._receipts is None or result.parsed is None or result.near_duplicate is not None:
+            return result
+        try:
+            with timed("store"):
+                result.receipt_id = await asyncio.to_thread(
+                    self._receipts.save, digest or hash_bytes(contents), result.parsed, tier=result.tier
+                )
+        except Exception:
+            logger.exception("Failed to save the analyzed receipt")
+        return result
+
+    async def _try_ocr_tier(
+        self, contents: bytes
+    ) -> tuple[Optional[str], Optional[float], Optional[AnalyzeResponse]]:
+        """In ``ocr_first`` mode, OCR and parse locally before involving the LLM.
+
+        Returns the OCR text and its confidence score, plus the finished response
+        when the score clears ``ocr_confidence_threshold``. Otherwise the request
+        escalates to the LLM, reusing the OCR text instead of running OCR again.
+        """
+
+        if self._settings.extraction_mode != "ocr_first" or not self._ocr_enabled:
+            return None, None, None
+        ocr_text = await self._ocr.read_text_async(image=contents)
+        if not ocr_text:
+            EXTRACTION_TIERS.inc(outcome="escalated")
+            return ocr_text, None, None
+        with timed("ocr_parse"):
+            receipt = parse_receipt_from_ocr(ocr_text)
+        confidence = receipt_confidence(receipt)
+        if confidence < self._settings.ocr_confidence_threshold:
+            EXTRACTION_TIERS.inc(outcome="escalated")
+            return ocr_text, confidence, None
+        EXTRACTION_TIERS.inc(outcome="ocr")
+        response = AnalyzeResponse(parsed=receipt, ocr_text=ocr_text, tier="ocr", ocr_confidence=confidence)
+        return ocr_text, confidence, response
+
+    def _start_ocr(self, contents: bytes) -> Optional[asyncio.Future[Optional[str]]]:
+        if self._ocr_enabled and self._settings.ocr_mode == "concurrent":
+            # Start OCR alongside the LLM call so a fallback never waits for both in series.
+            return self._ocr.submit(image=contents)
+        return None
+
+    @property
+    def _ocr_enabled(self) -> bool:
+        return self._settings.enable_ocr_fallback and self._ocr.available
+
+    async def _finish(
+        self,
+        *,
+        contents: bytes,
+        raw_text: Optional[str],
+        receipt: Optional[ReceiptData],
+        warnings: list[str],
+        gemini_failed: bool,
+        ocr_future: Optional[asyncio.Future[Optional[str]]],
+        near_duplicate: Optional[NearDuplicateMatch] = None,
+        ocr_text: Optional[str] = None,
+        ocr_confidence: Optional[float] = None,
+    ) -> AnalyzeResponse:
+        """Run or collect OCR as configured and fall back to OCR parsing when the LLM failed.
+
+        ``ocr_text`` is passed when the OCR tier already read the image.
+        """
+
+        ocr_enabled = self._ocr_enabled
+        tier = "llm" if receipt is not None else None
+        if ocr_text is None and ocr_enabled:
+            if gemini_failed or self._settings.ocr_on_success:
+                if ocr_future is not None:
+                    ocr_text = await ocr_future
+                else:
+                    ocr_text = await self._ocr.read_text_async(image=contents)
+            elif ocr_future is not None:
+                ocr_future.cancel()
+        elif ocr_text is None and self._settings.enable_ocr_fallback:
             warnings.append("OCR fallback requested but pytesseract/Pillow not installed.")
 
-        return AnalyzeResponse(parsed=receipt, raw_text=raw_text, ocr_text=ocr_text, warnings=warnings)
+        # If Gemini failed and we have OCR text, try to parse it
+        if gemini_failed and ocr_text and not receipt:
+            try:
+                with timed("ocr_parse"):
+                    receipt = parse_receipt_from_ocr(ocr_text)
+                tier = "ocr"
+                ocr_confidence = receipt_confidence(receipt)
+                if receipt.merchant_name or receipt.total:
+                    FALLBACKS.inc(kind="ocr", target="ocr_parser")
+                    warnings.append("Using OCR-based parsing as Gemini quota was exceeded.")
+            except Exception as parse_exc:
+                warnings.append(f"OCR parsing failed: {str(parse_exc)[:100]}")
+
+        return AnalyzeResponse(
+            parsed=receipt,
+            raw_text=raw_text,
+            ocr_text=ocr_text,
+            warnings=warnings,
+            tier=tier,
+            ocr_confidence=ocr_confidence,
+            near_duplicate=near_duplicate,
+        )
+
+    async def _analyze_pdf(self, contents: bytes) -> AnalyzeResponse:
+        """Rasterize pages one at a time and analyze up to ``pdf_page_concurrency`` of them at once."""
+
+        if not pdf_available():
+            return AnalyzeResponse(warnings=["PDF support requires pypdfium2 to be installed."])
+
+        slots = asyncio.Semaphore(max(self._settings.pdf_page_concurrency, 1))
+        pages = iter_pdf_pages(
+            contents, dpi=self._settings.pdf_render_dpi, max_pages=self._settings.pdf_max_pages
+        )
+
+        async def analyze_page(page: bytes) -> AnalyzeResponse:
+            try:
+                # Pages of one document share a layout, so a near-duplicate match
+                # could hand one page another page's data: only exact hits are reused.
+                return await self._analyze_image(contents=page, mime_type=PAGE_MIME_TYPE, near_duplicates=False)
+            finally:
+                slots.release()
+
+        tasks: list[asyncio.Task[AnalyzeResponse]] = []
+        read_error: Optional[str] = None
+        rendering: Optional[asyncio.Task[Optional[bytes]]] = None
+        try:
+            while True:
+                # Only render the next page once a slot is free, so at most
+                # pdf_page_concurrency rendered pages are held in memory.
+                await slots.acquire()
+                rendering = asyncio.create_task(asyncio.to_thread(next, pages, None))
+                try:
+                    # Shielded: a cancelled request must not abandon the thread mid-render (see finally).
+                    page = await asyncio.shield(rendering)
+                except Exception as exc:
+                    read_error = f"Failed to read PDF: {str(exc)[:200]}"
+                    page = None
+                if page is None:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(analyze_page(page)))
+            results = list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Closing takes the pdfium lock, so it runs on a worker thread, and only
+            # once no thread is inside next() (a running generator can't be closed).
+            loop = asyncio.get_running_loop()
+            if rendering is not None and not rendering.done():
+                rendering.add_done_callback(
+                    lambda done: (done.cancelled() or done.exception(), loop.run_in_executor(None, pages.close))
+                )
+            else:
+                loop.run_in_executor(None, pages.close)
+
+        if not results:
+            return AnalyzeResponse(warnings=[read_error or "PDF has no pages."])
+        merged = merge_page_results(results)
+        if read_error:
+            merged.warnings.append(read_error)
+        return merged
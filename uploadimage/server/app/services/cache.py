@@ -0,0 +1,166 @@
+"""Content-addressed cache for LLM receipt analyses."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from app.services.metrics import CACHE_LOOKUPS
+from app.services.shared_state import SharedStateStore, record_unavailable
+
+CachedAnalysis = tuple[str, dict[str, Any]]
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_cache_key(
+    *, image_digest: str, provider: str, model: str, prompt: str, preprocessing: str = "original"
+) -> str:
+    """Derive a cache key from the image digest and everything that shapes the LLM output."""
+
+    digest = hashlib.sha256()
+    for part in (provider, model, prompt, preprocessing, image_digest):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Memory LRU in front of an optional cross-worker SQLite tier and an optional disk tier.
+
+    Concurrent requests for the same key within a process share one computation.
+    The shared tier is best effort: while its database is locked, lookups miss
+    and writes are skipped.
+    """
+
+    def __init__(
+        self, *, max_entries: int, directory: Optional[Path] = None, shared: Optional[SharedStateStore] = None
+    ) -> None:
+        self._max_entries = max(max_entries, 0)
+        self._memory: OrderedDict[str, CachedAnalysis] = OrderedDict()
+        self._directory = directory
+        self._shared = shared
+        self._inflight: dict[str, asyncio.Task[CachedAnalysis]] = {}
+        if self._directory is not None:
+            self._directory.mkdir(parents=True, exist_ok=True)
+
+    async def get(self, key: str) -> Optional[CachedAnalysis]:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            CACHE_LOOKUPS.inc(result="memory_hit")
+            return value
+
+        value = await self._get_shared(key)
+        if value is not None:
+            self._remember(key, value)
+            CACHE_LOOKUPS.inc(result="shared_hit")
+            return value
+
+        value = await asyncio.to_thread(self._read_disk, key) if self._directory is not None else None
+        if value is not None:
+            self._remember(key, value)
+            CACHE_LOOKUPS.inc(result="disk_hit")
+        return value
+
+    async def put(self, key: str, value: CachedAnalysis) -> None:
+        self._remember(key, value)
+        if self._shared is not None:
+            try:
+                await asyncio.to_thread(self._shared.cache_put, key, *value)
+            except sqlite3.OperationalError as exc:
+                record_unavailable("cache_put", exc)
+        if self._directory is not None:
+            await asyncio.to_thread(self._write_disk, key, value)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[tuple[CachedAnalysis, bool]]]
+    ) -> CachedAnalysis:
+        """Return a cached analysis, sharing a single in-flight computation per key.
+
+        ``compute`` returns the analysis and whether it may be cached; waiters
+        that joined the computation get the result either way. The computation
+        runs as its own task, so cancelling one caller (a client disconnect, a
+        failed sibling PDF page) doesn't cancel it for the others.
+        """
+
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            CACHE_LOOKUPS.inc(result="coalesced")
+        else:
+            CACHE_LOOKUPS.inc(result="miss")
+            pending = asyncio.create_task(self._compute(key, compute))
+            self._inflight[key] = pending
+            pending.add_done_callback(functools.partial(self._settle, key))
+        return await asyncio.shield(pending)
+
+    async def _compute(
+        self, key: str, compute: Callable[[], Awaitable[tuple[CachedAnalysis, bool]]]
+    ) -> CachedAnalysis:
+        value, cacheable = await compute()
+        if cacheable:
+            await self.put(key, value)
+        return value
+
+    def _settle(self, key: str, task: asyncio.Task[CachedAnalysis]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every caller may have gone away; mark the outcome as retrieved so it isn't logged as lost.
+        if not task.cancelled():
+            task.exception()
+
+    async def _get_shared(self, key: str) -> Optional[CachedAnalysis]:
+        if self._shared is None:
+            return None
+        try:
+            return await asyncio.to_thread(self._shared.cache_get, key)
+        except sqlite3.OperationalError as exc:
+            record_unavailable("cache_get", exc)
+            return None
+
+    def _remember(self, key: str, value: CachedAnalysis) -> None:
+        if self._max_entries == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> Path:
+        assert self._directory is not None
+        return self._directory / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[CachedAnalysis]:
+        if self._directory is None:
+            return None
+        try:
+            payload = json.loads(self._disk_path(key).read_text(encoding="utf-8"))
+            return payload["raw_text"], payload["parsed"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_disk(self, key: str, value: CachedAnalysis) -> None:
+        if self._directory is None:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        raw_text, parsed = value
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({"raw_text": raw_text, "parsed": parsed}), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError:  # pragma: no cover - disk tier is best effort
+            tmp_path.unlink(missing_ok=True)
@@ -2,19 +2,31 @@
 
 from __future__ import annotations
 
-import base64
-import io
+import asyncio
 import json
-from typing import Any
+import logging
+import time
+from typing import Any, AsyncIterator, Callable
 
-import google.generativeai as genai
-import google.generativeai.types as genai_types
-import requests
-from PIL import Image
+import httpx
 
 from app.core.config import get_settings
+from app.schemas.analyze import ReceiptData
+from app.services.metrics import LLM_SECONDS, PAYLOAD_BYTES, observe_stage
+from app.services.request_body import IMAGE_PLACEHOLDER, StreamedJSONBody
+from app.services.response_schema import gemini_response_schema, json_response_schema
+from app.services.scheduler import QuotaExceededError, parse_retry_after
 
+logger = logging.getLogger(__name__)
+
+# The response schema is enforced by the provider, so the prompt only has to describe the task.
 PROMPT = (
+    "Extract the data printed on this receipt image. Leave out fields that are not on the receipt. "
+    "Amounts are plain numbers without currency symbols."
+)
+
+# Used when structured output is disabled and the schema has to be spelled out in the prompt.
+SCHEMA_PROMPT = (
     "You are an expert OCR post-processor. Given a receipt image, respond with a JSON object\n"
     "strictly following this schema: {\n"
     "  \"merchant_name\": string|null,\n"
@@ -37,90 +49,302 @@ PROMPT = (
 )
 
 
+class LLMStream:
+    """An open server-sent-events completion; iterate ``text()`` for deltas, then ``aclose()``."""
+
+    def __init__(self, response: httpx.Response, *, provider: str, on_close: Callable[[bool], None]) -> None:
+        self._response = response
+        self._provider = provider
+        self._on_close = on_close
+        self._completed = False
+        self._closed = False
+
+    async def text(self) -> AsyncIterator[str]:
+        async for line in self._response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:") :].strip()
+            if not data or data == "[DONE]":
+                continue
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            delta = _google_delta(event) if self._provider == "google" else _openrouter_delta(event)
+            if delta:
+                yield delta
+        self._completed = True
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._response.aclose()
+        finally:
+            self._on_close(self._completed)
+
+
+def _google_delta(event: dict[str, Any]) -> str:
+    if "error" in event:
+        raise RuntimeError(f"Gemini stream failed: {str(event['error'])[:200]}")
+    block_reason = (event.get("promptFeedback") or {}).get("blockReason")
+    if block_reason:
+        raise RuntimeError(f"Content was blocked: {block_reason}")
+    parts = (event.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts if isinstance(part, dict))
+
+
+def _openrouter_delta(event: dict[str, Any]) -> str:
+    if "error" in event:
+        raise RuntimeError(f"OpenRouter stream failed: {str(event['error'])[:200]}")
+    content = ((event.get("choices") or [{}])[0].get("delta") or {}).get("content")
+    return content if isinstance(content, str) else ""
+
+
 class GeminiClient:
-    def __init__(self) -> None:
+    def __init__(self, provider: str | None = None) -> None:
         self._settings = get_settings()
-        if not self._settings.gemini_api_key:
-            raise RuntimeError("GEMINI_API_KEY is not configured")
-
-        self._provider = self._settings.llm_provider
-        if self._provider == "google":
-            genai.configure(api_key=self._settings.gemini_api_key)
-            self._model = genai.GenerativeModel(self._settings.gemini_model)
-        elif self._provider == "openrouter":
-            self._model = None
-        else:  # pragma: no cover - invalid configuration
+        self._provider = provider or self._settings.llm_provider
+        self._api_key = self._settings.api_key_for(self._provider)
+        if self._provider not in ("google", "openrouter"):  # pragma: no cover - invalid configuration
             raise RuntimeError(f"Unsupported LLM provider: {self._provider}")
 
-    def analyze(self, *, image_bytes: bytes, mime_type: str) -> tuple[str, dict[str, Any]]:
+        self._http: httpx.AsyncClient | None = None
+        self._limits = {
+            "google": asyncio.Semaphore(self._settings.google_max_concurrency),
+            "openrouter": asyncio.Semaphore(self._settings.openrouter_max_concurrency),
+        }
+
+    async def analyze(
+        self, *, image_bytes: bytes, mime_type: str, model: str | None = None
+    ) -> tuple[str, dict[str, Any]]:
         """Send image to selected provider and parse response as JSON."""
 
-        if self._provider == "google":
-            text = self._google_call(image_bytes=image_bytes, mime_type=mime_type)
-        else:
-            text = self._openrouter_call(image_bytes=image_bytes, mime_type=mime_type)
+        self._require_api_key()
+        model = model or self._settings.gemini_model
+        async with self._limits[self._provider]:
+            PAYLOAD_BYTES.inc(len(image_bytes), direction="llm_request")
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                if self._provider == "google":
+                    text = await self._google_call(image_bytes=image_bytes, mime_type=mime_type, model=model)
+                else:
+                    text = await self._openrouter_call(image_bytes=image_bytes, mime_type=mime_type, model=model)
+                outcome = "ok"
+            except QuotaExceededError:
+                outcome = "rate_limited"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                LLM_SECONDS.observe(elapsed, provider=self._provider, model=model, outcome=outcome)
+                observe_stage("llm", elapsed, description=f"{self._provider}/{model}")
+
+        return self.parse_response(text)
 
+    def parse_response(self, text: str) -> tuple[str, dict[str, Any]]:
         cleaned = self._strip_code_fences(text)
         try:
             return cleaned, json.loads(cleaned)
         except json.JSONDecodeError as exc:  # pragma: no cover - defensive logging
             raise RuntimeError("Gemini response is not valid JSON") from exc
 
-    def _google_call(self, *, image_bytes: bytes, mime_type: str) -> str:
-        # Convert bytes to PIL Image
+    async def open_stream(self, *, image_bytes: bytes, mime_type: str, model: str | None = None) -> LLMStream:
+        """Start a streaming completion; raises QuotaExceededError before any text on 429.
+
+        The caller must ``aclose()`` the returned stream, which also frees the provider slot.
+        """
+
+        self._require_api_key()
+        model = model or self._settings.gemini_model
+        semaphore = self._limits[self._provider]
+        await semaphore.acquire()
+        PAYLOAD_BYTES.inc(len(image_bytes), direction="llm_request")
+        started = time.perf_counter()
+        if self._provider == "google":
+            api_base = self._settings.google_api_base.rstrip("/")
+            body_headers, body = self._encode_body(self._google_payload(mime_type=mime_type), image_bytes)
+            request = self._client().build_request(
+                "POST",
+                f"{api_base}/models/{model}:streamGenerateContent",
+                params={"alt": "sse"},
+                headers={"x-goog-api-key": self._api_key, **body_headers},
+                content=body,
+            )
+        else:
+            api_base = self._settings.openrouter_api_base.rstrip("/")
+            payload = self._openrouter_payload(mime_type=mime_type, model=model)
+            payload["stream"] = True
+            body_headers, body = self._encode_body(payload, image_bytes)
+            request = self._client().build_request(
+                "POST",
+                f"{api_base}/chat/completions",
+                headers={**self._openrouter_headers(), **body_headers},
+                content=body,
+            )
+
+        outcome = "error"
+        try:
+            try:
+                response = await self._client().send(request, stream=True)
+            except httpx.HTTPError as exc:  # pragma: no cover - network failure
+                raise RuntimeError(f"LLM streaming call failed: {exc}") from exc
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+                if response.status_code == 429:
+                    outcome = "rate_limited"
+                    raise self._quota_error(response, model=model)
+                raise RuntimeError(f"LLM streaming call failed: {response.status_code} {response.text[:200]}")
+        except BaseException:
+            elapsed = time.perf_counter() - started
+            LLM_SECONDS.observe(elapsed, provider=self._provider, model=model, outcome=outcome)
+            semaphore.release()
+            raise
+
+        def on_close(completed: bool) -> None:
+            elapsed = time.perf_counter() - started
+            outcome = "ok" if completed else "error"
+            LLM_SECONDS.observe(elapsed, provider=self._provider, model=model, outcome=outcome)
+            observe_stage("llm", elapsed, description=f"{self._provider}/{model}")
+            semaphore.release()
+
+        return LLMStream(response, provider=self._provider, on_close=on_close)
+
+    @property
+    def provider(self) -> str:
+        return self._provider
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._api_key)
+
+    @property
+    def prompt_signature(self) -> str:
+        """The prompt plus the enforced response schema, for use in cache keys."""
+
+        if not self._settings.llm_structured_output:
+            return SCHEMA_PROMPT
+        return PROMPT + json.dumps(self._response_schema(), sort_keys=True)
+
+    def _response_schema(self) -> dict[str, Any]:
+        if self._provider == "google":
+            return gemini_response_schema(ReceiptData)
+        return json_response_schema(ReceiptData)
+
+    def _require_api_key(self) -> None:
+        if not self.configured:
+            if self._provider != self._settings.llm_provider:
+                raise RuntimeError(
+                    f"Hedging to {self._provider} needs OPENROUTER_API_KEY, with GEMINI_API_KEY as the Google key"
+                )
+            raise RuntimeError("GEMINI_API_KEY is not configured")
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the provider so the first analysis skips DNS and TLS setup."""
+
+        if not self.configured:
+            return
+        if self._provider == "google":
+            url = f"{self._settings.google_api_base.rstrip('/')}/models"
+            headers = {"x-goog-api-key": self._api_key}
+        else:
+            url = f"{self._settings.openrouter_api_base.rstrip('/')}/models"
+            headers = self._openrouter_headers()
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-        except Exception as exc:
-            raise RuntimeError(f"Failed to open image: {exc}") from exc
-        
-        # Configure safety settings - use dict format for compatibility
-        # The SDK accepts both dict and SafetySetting objects
-        safety_settings = [
-            {
-                "category": genai_types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                "threshold": genai_types.HarmBlockThreshold.BLOCK_NONE,
-            },
-            {
-                "category": genai_types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                "threshold": genai_types.HarmBlockThreshold.BLOCK_NONE,
-            },
-        ]
-        
-        # Generate content with image and prompt
+            await self._client().get(url, headers=headers, params={"pageSize": 1}, timeout=5.0)
+        except httpx.HTTPError as exc:
+            logger.warning("Could not pre-open a connection to %s: %s", url, exc)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # One pooled client per GeminiClient keeps TLS connections to its provider warm.
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self._settings.request_timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self._settings.http_max_connections,
+                    max_keepalive_connections=self._settings.http_max_keepalive_connections,
+                ),
+            )
+        return self._http
+
+    @staticmethod
+    def _encode_body(payload: dict[str, Any], image_bytes: bytes) -> tuple[dict[str, str], Any]:
+        """Request headers and content for a payload whose image is ``IMAGE_PLACEHOLDER``."""
+
+        body = StreamedJSONBody(payload, image_bytes)
+        return body.headers, body
+
+    def _google_payload(self, *, mime_type: str) -> dict[str, Any]:
+        structured = self._settings.llm_structured_output
+        payload: dict[str, Any] = {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [
+                        {"text": PROMPT if structured else SCHEMA_PROMPT},
+                        {
+                            "inline_data": {
+                                "mime_type": mime_type,
+                                "data": IMAGE_PLACEHOLDER,
+                            }
+                        },
+                    ],
+                }
+            ],
+            "safetySettings": [
+                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+            ],
+        }
+        if structured:
+            payload["generationConfig"] = {
+                "responseMimeType": "application/json",
+                "responseSchema": self._response_schema(),
+            }
+        return payload
+
+    async def _google_call(self, *, image_bytes: bytes, mime_type: str, model: str) -> str:
+        api_base = self._settings.google_api_base.rstrip("/")
+        body_headers, body = self._encode_body(self._google_payload(mime_type=mime_type), image_bytes)
         try:
-            result = self._model.generate_content(
-                [PROMPT, image],
-                safety_settings=safety_settings,
+            response = await self._client().post(
+                f"{api_base}/models/{model}:generateContent",
+                headers={"x-goog-api-key": self._api_key, **body_headers},
+                content=body,
             )
-        except Exception as exc:
-            error_msg = str(exc)
-            # Check for quota errors and provide helpful message
-            if "429" in error_msg or "quota" in error_msg.lower() or "Quota exceeded" in error_msg:
-                raise RuntimeError(
-                    f"Quota exceeded for model {self._settings.gemini_model}. "
-                    f"The app will try to use OCR fallback parsing. To fix: (1) Wait ~36 seconds for quota reset, "
-                    f"(2) Try a different model in .env (gemini-2.0-flash, gemini-2.5-flash, gemini-2.5-flash-image), "
-                    f"or (3) Upgrade your Google AI Studio plan. Error: {error_msg[:150]}"
-                ) from exc
+        except httpx.HTTPError as exc:  # pragma: no cover - network failure
             raise RuntimeError(f"Gemini API call failed: {exc}") from exc
-        
-        text = getattr(result, "text", None)
+
+        if response.status_code == 429:
+            raise self._quota_error(response, model=model)
+        if response.is_error:
+            raise RuntimeError(f"Gemini API call failed: {response.status_code} {response.text[:200]}")
+
+        data = response.json()
+        parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts if isinstance(part, dict))
         if not text:
             # Check for blocked content or other issues
-            if hasattr(result, "prompt_feedback"):
-                feedback = result.prompt_feedback
-                if feedback and hasattr(feedback, "block_reason"):
-                    raise RuntimeError(f"Content was blocked: {feedback.block_reason}")
+            block_reason = (data.get("promptFeedback") or {}).get("blockReason")
+            if block_reason:
+                raise RuntimeError(f"Content was blocked: {block_reason}")
             raise RuntimeError("Gemini did not return any text")
         return text
 
-    def _openrouter_call(self, *, image_bytes: bytes, mime_type: str) -> str:
-        api_base = self._settings.openrouter_api_base.rstrip("/")
-        data_url = self._build_data_url(image_bytes=image_bytes, mime_type=mime_type)
-        payload = {
-            "model": self._settings.gemini_model,
+    def _openrouter_payload(self, *, mime_type: str, model: str) -> dict[str, Any]:
+        data_url = f"data:{mime_type};base64,{IMAGE_PLACEHOLDER}"
+        structured = self._settings.llm_structured_output
+        payload: dict[str, Any] = {
+            "model": model,
             "messages": [
-                {"role": "system", "content": [{"type": "text", "text": PROMPT}]},
+                {"role": "system", "content": [{"type": "text", "text": PROMPT if structured else SCHEMA_PROMPT}]},
                 {
                     "role": "user",
                     "content": [
@@ -130,21 +354,35 @@ class GeminiClient:
                 },
             ],
         }
-        headers = {
-            "Authorization": f"Bearer {self._settings.gemini_api_key}",
+        if structured:
+            payload["response_format"] = {
+                "type": "json_schema",
+                # Not strict: OpenAI-style strict mode forbids free-form objects like additional_fields.
+                "json_schema": {"name": "receipt", "strict": False, "schema": self._response_schema()},
+            }
+        return payload
+
+    def _openrouter_headers(self) -> dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self._api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": self._settings.client_app_url or "http://localhost",
             "X-Title": self._settings.client_app_title,
         }
+
+    async def _openrouter_call(self, *, image_bytes: bytes, mime_type: str, model: str) -> str:
+        api_base = self._settings.openrouter_api_base.rstrip("/")
+        body_headers, body = self._encode_body(self._openrouter_payload(mime_type=mime_type, model=model), image_bytes)
         try:
-            response = requests.post(
+            response = await self._client().post(
                 f"{api_base}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=self._settings.request_timeout_seconds,
+                headers={**self._openrouter_headers(), **body_headers},
+                content=body,
             )
+            if response.status_code == 429:
+                raise self._quota_error(response, model=model)
             response.raise_for_status()
-        except requests.RequestException as exc:  # pragma: no cover - network failure
+        except httpx.HTTPError as exc:  # pragma: no cover - network failure
             raise RuntimeError(f"OpenRouter request failed: {exc}") from exc
 
         data = response.json()
@@ -169,9 +407,23 @@ class GeminiClient:
         return text
 
     @staticmethod
-    def _build_data_url(*, image_bytes: bytes, mime_type: str) -> str:
-        encoded = base64.b64encode(image_bytes).decode("ascii")
-        return f"data:{mime_type};base64,{encoded}"
+    def _quota_error(response: httpx.Response, *, model: str) -> QuotaExceededError:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        retry_after = parse_retry_after(response.headers, body)
+        wait_hint = "Wait for quota reset"
+        if retry_after is not None:
+            wait_hint = f"Wait ~{retry_after:.0f} seconds for quota reset"
+        return QuotaExceededError(
+            f"Quota exceeded for model {model}. "
+            f"The app will try to use OCR fallback parsing. To fix: (1) {wait_hint}, "
+            f"(2) Add fallback models via GEMINI_FALLBACK_MODELS (gemini-2.0-flash, gemini-2.5-flash, "
+            f"gemini-2.5-flash-image), or (3) Upgrade your plan. Error: {response.text[:150]}",
+            model=model,
+            retry_after=retry_after,
+        )
 
     @staticmethod
     def _strip_code_fences(text: str) -> str:
@@ -0,0 +1,221 @@
+"""Hedged LLM calls across the Google and OpenRouter providers, with a circuit breaker per provider."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from app.services.gemini import GeminiClient
+from app.services.metrics import CIRCUIT_OPEN, HEDGES
+from app.services.scheduler import ModelScheduler, QuotaExceededError
+
+T = TypeVar("T")
+
+# Below this many samples the hedge delay falls back to the configured initial delay.
+_MIN_SAMPLES = 20
+
+
+class CircuitBreaker:
+    """Stops traffic to a provider after ``failure_threshold`` consecutive failures.
+
+    Once ``cooldown`` seconds have passed, a single trial call is let through
+    (half-open). Success closes the circuit; failure opens it for another
+    cooldown. Rate limiting is not a failure: the scheduler already backs off.
+    """
+
+    def __init__(self, name: str, *, failure_threshold: int, cooldown: float) -> None:
+        self._name = name
+        self._threshold = max(failure_threshold, 1)
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self._opened_at >= self._cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in the half-open state this claims the single trial."""
+
+        if self._opened_at is None:
+            return True
+        if self._trial or time.monotonic() - self._opened_at < self._cooldown:
+            return False
+        self._trial = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial = False
+        if self._opened_at is not None:
+            self._opened_at = None
+            CIRCUIT_OPEN.set(0, provider=self._name)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self._threshold:
+            self._opened_at = time.monotonic()
+            self._trial = False
+            CIRCUIT_OPEN.set(1, provider=self._name)
+
+    def release(self) -> None:
+        """Hand back a trial that ended without a verdict (cancelled, or rate limited)."""
+
+        self._trial = False
+
+
+class LatencyWindow:
+    """Durations of the most recent successful calls."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class Route:
+    client: GeminiClient
+    scheduler: ModelScheduler
+    breaker: CircuitBreaker
+    latencies: LatencyWindow = field(default_factory=LatencyWindow)
+
+    @property
+    def provider(self) -> str:
+        return self.client.provider
+
+
+class HedgedLLM:
+    """Runs a call on the primary provider and, when it is slow or fails, on the next one too.
+
+    The hedge goes out once the primary has been running longer than its recent
+    ``percentile`` latency (``initial_delay`` until enough calls have been seen,
+    never less than ``min_delay``), or straight away if the primary fails. The
+    first successful result wins and the other call is cancelled. Providers
+    whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, routes: list[Route], *, percentile: float, min_delay: float, initial_delay: float) -> None:
+        if not routes:
+            raise ValueError("HedgedLLM needs at least one route")
+        self._routes = routes
+        self._percentile = percentile
+        self._min_delay = min_delay
+        self._initial_delay = initial_delay
+
+    @property
+    def routes(self) -> list[Route]:
+        return list(self._routes)
+
+    def hedge_delay(self, route: Route) -> float:
+        observed = route.latencies.percentile(self._percentile)
+        return max(observed if observed is not None else self._initial_delay, self._min_delay)
+
+    @asynccontextmanager
+    async def claim(self) -> AsyncIterator[Route]:
+        """The first provider whose breaker lets a call through, for calls that cannot be hedged (streaming).
+
+        The outcome of the ``async with`` body is recorded on that provider's
+        breaker and latency window, as for a hedged attempt.
+        """
+
+        for route in self._routes:
+            trial = route.breaker.state != "closed"
+            if route.breaker.allow():
+                break
+        else:
+            raise RuntimeError("All LLM providers are unavailable (circuit breakers open)")
+        started = time.perf_counter()
+        try:
+            yield route
+        except (asyncio.CancelledError, GeneratorExit, QuotaExceededError):
+            if trial:
+                route.breaker.release()
+            raise
+        except Exception:
+            route.breaker.record_failure()
+            raise
+        route.latencies.add(time.perf_counter() - started)
+        route.breaker.record_success()
+
+    async def run(self, call: Callable[[GeminiClient, str], Awaitable[T]]) -> T:
+        """Run ``call(client, model)`` with hedging; raises the primary's error when every provider fails."""
+
+        pending: dict[asyncio.Task[T], Route] = {}
+        candidates = iter(self._routes)
+        errors: list[BaseException] = []
+
+        def launch_next() -> Optional[Route]:
+            for route in candidates:
+                trial = route.breaker.state != "closed"
+                if route.breaker.allow():
+                    task = asyncio.create_task(self._attempt(route, call, trial=trial))
+                    # Losers are cancelled without being awaited; don't warn about their errors.
+                    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+                    pending[task] = route
+                    return route
+            return None
+
+        primary = launch_next()
+        if primary is None:
+            raise RuntimeError("All LLM providers are unavailable (circuit breakers open)")
+        timeout: Optional[float] = self.hedge_delay(primary)
+        hedged = False
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than usual: race it against the next provider.
+                    timeout = None
+                    hedged = launch_next() is not None
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            HEDGES.inc(winner=route.provider)
+                        return task.result()
+                    errors.append(task.exception())  # type: ignore[arg-type]
+                if not pending:
+                    # Every call so far failed: fail over instead of waiting for the hedge delay.
+                    timeout = None
+                    launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
+        if hedged:
+            HEDGES.inc(winner="none")
+        raise errors[0]
+
+    @staticmethod
+    async def _attempt(route: Route, call: Callable[[GeminiClient, str], Awaitable[T]], *, trial: bool) -> T:
+        started = time.perf_counter()
+        try:
+            result = await route.scheduler.run(lambda model: call(route.client, model))
+        except (asyncio.CancelledError, QuotaExceededError):
+            if trial:
+                route.breaker.release()
+            raise
+        except Exception:
+            route.breaker.record_failure()
+            raise
+        route.latencies.add(time.perf_counter() - started)
+        route.breaker.record_success()
+        return result
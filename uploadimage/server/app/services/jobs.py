@@ -0,0 +1,336 @@
+"""Durable background analysis jobs backed by SQLite and a bounded worker pool."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import get_settings
+from app.schemas.analyze import AnalyzeResponse
+from app.schemas.jobs import JobResponse
+from app.services.analyzer import ReceiptAnalyzer
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    mime_type TEXT NOT NULL,
+    payload BLOB,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Columns added after the first release; older databases get them on open.
+_MIGRATIONS = {
+    "owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+    "heartbeat_at": "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL",
+}
+
+_FINISHED = ("done", "failed")
+
+# Workers wait this long for another process's write transaction before giving up.
+_BUSY_TIMEOUT_SECONDS = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class JobStore:
+    """SQLite persistence for jobs; the upload bytes are kept until the job finishes."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, statement in _MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(statement)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def create(self, *, contents: bytes, mime_type: str, filename: Optional[str]) -> JobResponse:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, filename, mime_type, payload, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, filename, mime_type, contents, now, now),
+            )
+        return JobResponse(id=job_id, status="queued", filename=filename, created_at=now, updated_at=now)
+
+    def get(self, job_id: str) -> Optional[JobResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, filename, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        result = AnalyzeResponse.model_validate_json(row["result"]) if row["result"] else None
+        return JobResponse(
+            id=row["id"],
+            status=row["status"],
+            filename=row["filename"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            result=result,
+            error=row["error"],
+        )
+
+    def claim_next(self, owner: str) -> Optional[tuple[str, bytes, str]]:
+        """Lease the oldest queued job to ``owner`` and return its id and upload, or None if none is queued.
+
+        The select and update are one statement, so two workers never claim the same job.
+        """
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat_at = ?, updated_at = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)"
+                " RETURNING id, payload, mime_type",
+                (owner, now, now),
+            ).fetchone()
+        return (row["id"], row["payload"], row["mime_type"]) if row else None
+
+    def heartbeat(self, owner: str, job_ids: list[str]) -> None:
+        """Renew the lease on the given jobs, if ``owner`` still holds them."""
+
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?"
+                f" WHERE owner = ? AND status = 'running' AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), owner, *job_ids),
+            )
+
+    def finish(self, job_id: str, owner: str, *, result: Optional[AnalyzeResponse], error: Optional[str]) -> bool:
+        """Record the outcome; False if the lease was lost and the job now belongs to another worker."""
+
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, owner = NULL, updated_at = ?"
+                " WHERE id = ? AND owner = ? AND status = 'running'",
+                (
+                    "failed" if error else "done",
+                    result.model_dump_json() if result else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    owner,
+                ),
+            ).rowcount > 0
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def requeue_expired(self, lease: float) -> int:
+        """Requeue running jobs whose worker stopped renewing its lease (crashed or killed)."""
+
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ?"
+                " WHERE status = 'running' AND COALESCE(heartbeat_at, 0) < ?",
+                (now, now - lease),
+            ).rowcount
+
+    def release(self, owner: str) -> int:
+        """Requeue the jobs ``owner`` is running, on a clean shutdown."""
+
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ?"
+                " WHERE owner = ? AND status = 'running'",
+                (time.time(), owner),
+            ).rowcount
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            ).rowcount
+
+
+class JobManager:
+    """Accepts uploads immediately and analyzes them on a fixed number of worker tasks.
+
+    Workers claim queued jobs from the database, so with several server
+    processes any of them can pick up a job, not just the one that accepted
+    it. A claimed job is leased to this process and the lease is renewed while
+    it runs; jobs whose lease lapses (the process died) are queued again.
+
+    A worker that hits an error (a locked database, an analysis cancelled
+    under it) logs it and moves on to the next job; only leases of jobs a
+    worker is still holding are renewed, so anything it dropped is requeued.
+    """
+
+    def __init__(self, analyzer: ReceiptAnalyzer) -> None:
+        self._settings = get_settings()
+        self._analyzer = analyzer
+        self._store: Optional[JobStore] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = asyncio.Event()
+        self._active: set[str] = set()
+        self._workers: list[asyncio.Task[None]] = []
+        self._changed = asyncio.Condition()
+        self._version = 0
+
+    async def start(self) -> None:
+        self._store = await asyncio.to_thread(JobStore, Path(self._settings.jobs_db_path))
+        await asyncio.to_thread(self._store.purge_finished, time.time() - self._settings.jobs_retention_seconds)
+        await asyncio.to_thread(self._store.requeue_expired, self._settings.jobs_lease_seconds)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{index}")
+            for index in range(max(self._settings.jobs_workers, 1))
+        ]
+        self._workers.append(asyncio.create_task(self._maintain_leases(), name="job-leases"))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._store is not None:
+            # Hand interrupted jobs straight back instead of waiting for the lease to lapse.
+            try:
+                self._store.release(self._owner)
+            except sqlite3.OperationalError as exc:
+                logger.warning("Could not release running jobs; they are requeued once their lease lapses: %s", exc)
+            self._store.close()
+            self._store = None
+
+    async def submit(self, *, contents: bytes, mime_type: str, filename: Optional[str]) -> JobResponse:
+        store = self._require_store()
+        if await asyncio.to_thread(store.count_pending) >= self._settings.jobs_max_pending:
+            raise JobQueueFull("Too many pending jobs, retry later")
+        job = await asyncio.to_thread(store.create, contents=contents, mime_type=mime_type, filename=filename)
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[JobResponse]:
+        return await asyncio.to_thread(self._require_store().get, job_id)
+
+    async def wait_for_update(self, job_id: str, since: float, timeout: float) -> Optional[JobResponse]:
+        """Return the job once it has changed after ``since``, or its current state after ``timeout``.
+
+        Changes made in this process wake the wait at once; the database is
+        also re-read every poll interval, for jobs run by other processes.
+        """
+
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._version
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.updated_at > since or job.status in _FINISHED or remaining <= 0:
+                return job
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._version != version),
+                        min(remaining, self._settings.jobs_poll_interval_seconds),
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    def _require_store(self) -> JobStore:
+        if self._store is None:
+            raise RuntimeError("Job manager is not started")
+        return self._store
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    async def _work(self) -> None:
+        store = self._require_store()
+        while True:
+            try:
+                claimed = await self._claim(store)
+                if claimed is not None:
+                    await self._run(store, *claimed)
+            except sqlite3.OperationalError as exc:
+                logger.warning("Job database unavailable, retrying: %s", exc)
+                await asyncio.sleep(self._settings.jobs_poll_interval_seconds)
+            except Exception:  # pragma: no cover - runtime safety
+                logger.exception("Job worker iteration failed")
+                await asyncio.sleep(self._settings.jobs_poll_interval_seconds)
+
+    async def _claim(self, store: JobStore) -> Optional[tuple[str, bytes, str]]:
+        self._wake.clear()
+        claimed = await asyncio.to_thread(store.claim_next, self._owner)
+        if claimed is None:
+            # Submissions to this process wake us; other processes' are found by polling.
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._settings.jobs_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+        return claimed
+
+    async def _run(self, store: JobStore, job_id: str, contents: bytes, mime_type: str) -> None:
+        self._active.add(job_id)
+        try:
+            await self._notify()
+            result: Optional[AnalyzeResponse] = None
+            error: Optional[str] = None
+            try:
+                result = await self._analyzer.analyze(contents=contents, mime_type=mime_type)
+            except asyncio.CancelledError:
+                # Stopping the worker cancels it; a cancellation from inside the analysis fails only this job.
+                if asyncio.current_task().cancelling():  # type: ignore[union-attr]
+                    raise
+                error = "Analysis failed: cancelled"
+            except Exception as exc:  # pragma: no cover - runtime safety
+                error = f"Analysis failed: {exc}"
+            if not await asyncio.to_thread(store.finish, job_id, self._owner, result=result, error=error):
+                logger.warning("Lease on job %s lapsed before it finished; its result was discarded", job_id)
+            await self._notify()
+        finally:
+            # If finish() failed, the job's lease stops being renewed and it is requeued once it lapses.
+            self._active.discard(job_id)
+
+    async def _maintain_leases(self) -> None:
+        store = self._require_store()
+        lease = self._settings.jobs_lease_seconds
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                await asyncio.to_thread(store.heartbeat, self._owner, list(self._active))
+                if await asyncio.to_thread(store.requeue_expired, lease):
+                    self._wake.set()
+            except sqlite3.OperationalError as exc:
+                logger.warning("Could not renew job leases: %s", exc)
@@ -0,0 +1,113 @@
+"""Incremental parsing of the receipt JSON while an LLM is still generating it."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+StreamEvent = tuple[str, dict[str, Any]]
+
+_ITEMS_FIELD = "line_items"
+
+
+class ReceiptStreamParser:
+    """Emit top-level fields and line items of the ``ReceiptData`` schema as soon as each is complete.
+
+    Text is scanned once, character by character, tracking nesting depth and
+    string state; a value is only decoded when its closing delimiter arrives.
+    Anything before the opening brace (e.g. a Markdown code fence) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escaped = False
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._item_count = 0
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> list[StreamEvent]:
+        self._text += chunk
+        events: list[StreamEvent] = []
+        text = self._text
+        while self._pos < len(text) and not self._finished:
+            index = self._pos
+            char = text[index]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        key = _decode(text[self._key_start : index + 1])
+                        self._key = key if isinstance(key, str) else None
+                        self._key_start = None
+                continue
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = index
+            elif char in "{[":
+                self._depth += 1
+                if char == "{" and self._depth == 3 and self._key == _ITEMS_FIELD:
+                    self._item_start = index
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    item = _decode(text[self._item_start : index + 1])
+                    self._item_start = None
+                    if isinstance(item, dict):
+                        events.append(("line_item", {"index": self._item_count, "item": item}))
+                        self._item_count += 1
+                elif self._depth == 0:
+                    self._finish_value(index, events)
+                    self._finished = True
+            elif char == ":" and self._depth == 1:
+                self._value_start = index + 1
+            elif char == "," and self._depth == 1:
+                self._finish_value(index, events)
+        return events
+
+    def _finish_value(self, end: int, events: list[StreamEvent]) -> None:
+        key, start = self._key, self._value_start
+        self._key = None
+        self._value_start = None
+        if key is None or start is None or key == _ITEMS_FIELD:
+            return
+        raw = self._text[start:end].strip()
+        if not raw:
+            return
+        value = _decode(raw)
+        if value is not _INVALID:
+            events.append(("field", {"name": key, "value": value}))
+
+
+_INVALID = object()
+
+
+def _decode(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return _INVALID
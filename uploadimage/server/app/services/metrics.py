@@ -0,0 +1,278 @@
+"""Minimal Prometheus metrics and per-request stage timings for the analysis pipeline."""
+
+from __future__ import annotations
+
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional, TypeVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = tuple[str, ...]
+M = TypeVar("M", bound="_Metric")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(label for label in extra if label)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self, constant: str = "") -> list[str]:
+        """Exposition lines; ``constant`` is a preformatted label added to every sample."""
+
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self, constant: str = "") -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key, constant)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[LabelValues, float] = defaultdict(float)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self, constant: str = "") -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key, constant)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self._buckets))
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] += value
+
+    def render(self, constant: str = "") -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, counts in sorted(self._counts.items()):
+                cumulative = 0
+                for bound, count in zip(self._buckets, counts):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    bucket_labels = _format_labels(self.label_names, key, constant, le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, constant)
+                lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of this process. Every sample carries a ``worker`` label (the pid), so
+    series from different gunicorn workers stay distinct and can be summed."""
+
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        # Read at render time: with a preloaded app the registry is created before workers fork.
+        worker = f'worker="{os.getpid()}"'
+        return "\n".join(line for metric in self._metrics for line in metric.render(worker)) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("receipt_stage_duration_seconds", "Time spent in each analysis pipeline stage.", ("stage",))
+)
+LLM_SECONDS = REGISTRY.register(
+    Histogram(
+        "receipt_llm_request_duration_seconds",
+        "Latency of LLM provider calls by provider, model and outcome.",
+        ("provider", "model", "outcome"),
+    )
+)
+CACHE_LOOKUPS = REGISTRY.register(
+    Counter("receipt_cache_lookups_total", "Result cache lookups by outcome.", ("result",))
+)
+RATE_LIMITED = REGISTRY.register(
+    Counter("receipt_llm_rate_limited_total", "LLM calls rejected with 429 / quota exhausted.", ("model",))
+)
+HEDGES = REGISTRY.register(
+    Counter(
+        "receipt_llm_hedges_total",
+        "Hedged LLM calls by the provider whose answer was used (none: every provider failed).",
+        ("winner",),
+    )
+)
+CIRCUIT_OPEN = REGISTRY.register(
+    Gauge("receipt_llm_circuit_open", "1 while a provider's circuit breaker is open.", ("provider",))
+)
+EXTRACTION_TIERS = REGISTRY.register(
+    Counter(
+        "receipt_extraction_tier_total",
+        "OCR-first attempts by outcome: served by OCR, or escalated to the LLM.",
+        ("outcome",),
+    )
+)
+FALLBACKS = REGISTRY.register(
+    Counter(
+        "receipt_fallbacks_total",
+        "Requests served by a fallback: another model, or OCR parsing instead of the LLM.",
+        ("kind", "target"),
+    )
+)
+ADMISSION_IN_FLIGHT = REGISTRY.register(
+    Gauge("receipt_admission_in_flight", "Synchronous analyses currently running.")
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("receipt_admission_queue_depth", "Synchronous analyses waiting for a slot.")
+)
+ADMISSION_REJECTIONS = REGISTRY.register(
+    Counter(
+        "receipt_admission_rejections_total",
+        "Analyses shed with 503 by reason: queue_full or queue_timeout.",
+        ("reason",),
+    )
+)
+SHARED_STATE_ERRORS = REGISTRY.register(
+    Counter(
+        "receipt_shared_state_errors_total",
+        "Shared-state operations skipped because the SQLite database was busy or unavailable.",
+        ("operation",),
+    )
+)
+PAYLOAD_BYTES = REGISTRY.register(
+    Counter("receipt_payload_bytes_total", "Bytes received in uploads and sent to LLM providers.", ("direction",))
+)
+
+
+class RequestTimings:
+    """Stage durations for one HTTP request, rendered as a Server-Timing header."""
+
+    def __init__(self) -> None:
+        self._durations: dict[str, float] = defaultdict(float)
+        self._descriptions: dict[str, str] = {}
+
+    def add(self, stage: str, seconds: float, description: Optional[str] = None) -> None:
+        self._durations[stage] += seconds
+        if description:
+            self._descriptions[stage] = description
+
+    def header_value(self) -> str:
+        entries = []
+        for stage, seconds in self._durations.items():
+            entry = f"{stage};dur={seconds * 1000:.1f}"
+            if stage in self._descriptions:
+                entry += f';desc="{self._descriptions[stage]}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+_current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "receipt_request_timings", default=None
+)
+
+
+def start_request_timings() -> RequestTimings:
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def observe_stage(stage: str, seconds: float, description: Optional[str] = None) -> None:
+    """Record a stage duration in the histogram and, inside a request, its Server-Timing header."""
+
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds, description)
+
+
+@contextmanager
+def timed(stage: str, description: Optional[str] = None) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, description)
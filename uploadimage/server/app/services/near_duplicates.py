@@ -0,0 +1,143 @@
+"""Perceptual hashing and a Hamming-distance index for reusing results of near-duplicate images."""
+
+from __future__ import annotations
+
+import io
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.services.cache import CachedAnalysis
+from app.services.shared_state import SharedStateStore, record_unavailable
+
+# 16x16 differences give a 256-bit hash: coarse enough to survive recompression,
+# resizing and small crops, fine enough to tell text layouts apart.
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def dhash(image: Any, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash of a decoded PIL image: one bit per horizontally adjacent pixel pair."""
+
+    from PIL import Image
+
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return bits
+
+
+def dhash_bytes(data: bytes) -> Optional[int]:
+    """Decode just enough of an encoded image to hash it; None when it can't be decoded."""
+
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            return dhash(ImageOps.exif_transpose(image))
+    except Exception:
+        return None
+
+
+@dataclass
+class NearDuplicateHit:
+    value: CachedAnalysis
+    distance: int
+
+
+class NearDuplicateIndex:
+    """Finds a stored analysis whose hash is within ``max_distance`` bits of a query.
+
+    The hash is split into ``max_distance + 1`` bands; by the pigeonhole principle
+    any hash within the distance matches at least one band exactly, so a lookup
+    only compares against the few entries sharing a band instead of all of them.
+    With a ``store``, entries added by other worker processes are picked up on
+    each lookup; both calls then block on SQLite, so run them in a thread. While
+    the store is locked, lookups use the entries already synced and adds are
+    skipped.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_distance: int,
+        max_entries: int,
+        context: str,
+        store: Optional[SharedStateStore] = None,
+    ) -> None:
+        self._max_distance = max(max_distance, 0)
+        self._max_entries = max(max_entries, 1)
+        self._context = context
+        self._store = store
+        bands = min(self._max_distance + 1, HASH_BITS)
+        edges = [HASH_BITS * i // bands for i in range(bands + 1)]
+        self._band_ranges = [(start, end - start) for start, end in zip(edges, edges[1:])]
+        self._bands: list[dict[int, set[int]]] = [{} for _ in self._band_ranges]
+        self._entries: OrderedDict[int, tuple[int, CachedAnalysis]] = OrderedDict()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, fingerprint: int) -> Optional[NearDuplicateHit]:
+        self._sync()
+        with self._lock:
+            candidates: set[int] = set()
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                candidates.update(band.get(key, ()))
+            best: Optional[NearDuplicateHit] = None
+            for entry_id in candidates:
+                stored, value = self._entries[entry_id]
+                distance = (stored ^ fingerprint).bit_count()
+                if distance <= self._max_distance and (best is None or distance < best.distance):
+                    best = NearDuplicateHit(value=value, distance=distance)
+            return best
+
+    def add(self, fingerprint: int, value: CachedAnalysis) -> None:
+        if self._store is not None:
+            try:
+                self._store.near_duplicate_add(
+                    self._context, format(fingerprint, "x"), *value, max_entries=self._max_entries
+                )
+            except sqlite3.OperationalError as exc:
+                record_unavailable("near_duplicate_add", exc)
+                return
+            self._sync()
+            return
+        with self._lock:
+            self._last_id += 1
+            self._insert(self._last_id, fingerprint, value)
+
+    def _sync(self) -> None:
+        if self._store is None:
+            return
+        try:
+            rows = self._store.near_duplicates_since(self._context, self._last_id)
+        except sqlite3.OperationalError as exc:
+            record_unavailable("near_duplicate_sync", exc)
+            return
+        with self._lock:
+            for entry_id, fingerprint, raw_text, parsed in rows:
+                self._insert(entry_id, int(fingerprint, 16), (raw_text, parsed))
+                self._last_id = max(self._last_id, entry_id)
+
+    def _band_keys(self, fingerprint: int) -> list[int]:
+        return [(fingerprint >> start) & ((1 << width) - 1) for start, width in self._band_ranges]
+
+    def _insert(self, entry_id: int, fingerprint: int, value: CachedAnalysis) -> None:
+        self._entries[entry_id] = (fingerprint, value)
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            band.setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self._max_entries:
+            old_id, (old_fingerprint, _) = self._entries.popitem(last=False)
+            for band, key in zip(self._bands, self._band_keys(old_fingerprint)):
+                members = band.get(key)
+                if members is not None:
+                    members.discard(old_id)
+                    if not members:
+                        del band[key]
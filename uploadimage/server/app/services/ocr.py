@@ -2,30 +2,126 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from types import ModuleType
+from typing import Any, Optional, Union
 
-try:  # pragma: no cover - optional dependency
-    import pytesseract
-    from PIL import Image
-except Exception:  # pragma: no cover - when OCR libs missing
-    pytesseract = None
-    Image = None
+from app.core.config import get_settings
+from app.services.metrics import observe_stage
+
+# Raw upload bytes, a path on disk, or an already decoded PIL image.
+ImageInput = Union[bytes, bytearray, memoryview, Path, Any]
+
+
+@functools.lru_cache(maxsize=None)
+def _ocr_modules() -> Optional[tuple[ModuleType, ModuleType]]:
+    # Imported on first use so that importing the app stays cheap.
+    try:  # pragma: no cover - optional dependency
+        import pytesseract
+        from PIL import Image
+    except Exception:  # pragma: no cover - when OCR libs missing
+        return None
+    return pytesseract, Image
+
+
+def _warm_worker() -> None:
+    # Import the OCR libraries and resolve the tesseract binary once per worker
+    # so the first real job doesn't pay for it.
+    modules = _ocr_modules()
+    if modules is not None:
+        try:
+            modules[0].get_tesseract_version()
+        except Exception:  # pragma: no cover - binary missing
+            pass
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def read_text_from_image(image: ImageInput) -> Optional[str]:
+    """Run OCR on an image; a module-level function so process pools can pickle it."""
+
+    modules = _ocr_modules()
+    if modules is None:
+        return None
+    pytesseract, Image = modules
+    try:
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            with Image.open(io.BytesIO(image)) as img:
+                return pytesseract.image_to_string(img)
+        if isinstance(image, Path):
+            with Image.open(image) as img:
+                return pytesseract.image_to_string(img)
+        return pytesseract.image_to_string(image)
+    except Exception:  # pragma: no cover - defensive
+        return None
 
 
 class OCRService:
     def __init__(self) -> None:
-        self._available = pytesseract is not None and Image is not None
+        self._settings = get_settings()
+        self._available = _ocr_modules() is not None
+        self._pool: Optional[ProcessPoolExecutor] = None
 
     @property
     def available(self) -> bool:
         return self._available
 
-    def read_text(self, *, file_path: Path) -> Optional[str]:
+    def read_text(self, *, image: ImageInput) -> Optional[str]:
+        """Run OCR synchronously in the calling process."""
+
         if not self._available:
             return None
-        try:
-            with Image.open(file_path) as img:
-                return pytesseract.image_to_string(img)
-        except Exception:  # pragma: no cover - defensive
-            return None
+        return read_text_from_image(image)
+
+    def submit(self, *, image: ImageInput) -> asyncio.Future[Optional[str]]:
+        """Schedule OCR on the worker pool; the returned future may be cancelled if unneeded."""
+
+        loop = asyncio.get_running_loop()
+        if not self._available:
+            future: asyncio.Future[Optional[str]] = loop.create_future()
+            future.set_result(None)
+            return future
+        started = time.perf_counter()
+        future = loop.run_in_executor(self._executor(), read_text_from_image, image)
+        future.add_done_callback(
+            lambda done: done.cancelled() or observe_stage("ocr", time.perf_counter() - started)
+        )
+        return future
+
+    async def read_text_async(self, *, image: ImageInput) -> Optional[str]:
+        return await self.submit(image=image)
+
+    async def warm_up(self) -> None:
+        """Start every pool worker now instead of on the first requests."""
+
+        if not self._available:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, _worker_pid) for _ in range(self._settings.ocr_workers))
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Workers are long-lived, so the slower but fork-safe spawn start method is paid once.
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(self._settings.ocr_workers, 1),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return self._pool
@@ -3,125 +3,143 @@
 from __future__ import annotations
 
 import re
-from typing import Any
+from typing import Iterable, Optional
 
 from app.schemas.analyze import LineItem, ReceiptData
 
+MAX_LINE_ITEMS = 20
+
+# All patterns are compiled once at import; the parser walks the text a single
+# time and classifies each line with at most a handful of anchored matches.
+_DATE_RE = re.compile(r"(?<!\d)(\d{4}[/-]\d{1,2}[/-]\d{1,2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})(?!\d)")
+_LEADING_DATE_RE = re.compile(r"^\d+[/-]\d+")
+_TRAILING_AMOUNT_RE = re.compile(r"^(?P<label>.*?)[\s:]*(?P<currency>[$₹€£])?\s*(?P<amount>\d[\d,]*\.\d{2})\s*$")
+_LABELED_AMOUNT_RE = re.compile(r"^(?P<label>.*?)[\s:]*(?P<currency>[$₹€£])?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*$")
+_QUANTITY_RE = re.compile(
+    r"^(?P<description>.*?)\s+(?P<quantity>\d+(?:\.\d+)?)\s*[@x]\s*\$?(?P<unit_price>\d[\d,]*\.\d{2})$",
+    re.IGNORECASE,
+)
+_SUMMARY_RE = re.compile(
+    r"\b(?:(?P<subtotal>sub[\s-]*total)|(?P<grand_total>grand\s+total)"
+    r"|(?P<total>total|amount\s+due|balance\s+due|amount)|(?P<tax>tax|vat|gst))\b",
+    re.IGNORECASE,
+)
+_NON_ITEM_RE = re.compile(
+    r"\b(?:change|tender(?:ed)?|paid|balance|cash|card|credit|debit|visa|master\s?card|amex|paypal)\b",
+    re.IGNORECASE,
+)
+_PAYMENT_RE = re.compile(r"\b(cash|credit|debit|visa|master\s?card|amex|american\s+express|paypal)\b", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_STREET_RE = re.compile(
+    r"^\d+\s+[\w\s.'-]+?\b(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln|way|highway|hwy)\b\.?",
+    re.IGNORECASE,
+)
+_LOCALITY_RE = re.compile(r"^[A-Za-z .'-]+,\s*[A-Za-z]{2,}(?:\s+\d{5}(?:-\d{4})?)?$")
+
+_PAYMENT_METHODS = {
+    "cash": "Cash",
+    "credit": "Credit Card",
+    "debit": "Debit Card",
+    "visa": "Visa",
+    "mastercard": "Mastercard",
+    "amex": "American Express",
+    "americanexpress": "American Express",
+    "paypal": "PayPal",
+}
+# Lower number wins when several payment keywords appear on one receipt.
+_PAYMENT_PRIORITY = {keyword: rank for rank, keyword in enumerate(_PAYMENT_METHODS)}
+
+
+def _amounts_match(amount: float, expected: float) -> bool:
+    # Allow a cent of rounding, or half a percent on large amounts.
+    return abs(amount - expected) <= max(0.011, abs(expected) * 0.005)
+
+
+def _to_float(raw: str) -> Optional[float]:
+    try:
+        return float(raw.replace(",", ""))
+    except ValueError:
+        return None
+
 
 def parse_receipt_from_ocr(ocr_text: str) -> ReceiptData:
-    """Extract basic receipt fields from OCR text using simple pattern matching."""
+    """Extract basic receipt fields from OCR text in a single pass over its lines."""
     if not ocr_text:
         return ReceiptData()
 
-    lines = ocr_text.split("\n")
-    text = ocr_text.lower()
+    merchant_name: Optional[str] = None
+    merchant_address: Optional[str] = None
+    purchase_date: Optional[str] = None
+    subtotal: Optional[float] = None
+    tax: Optional[float] = None
+    total: Optional[float] = None
+    grand_total: Optional[float] = None
+    payment_keyword: Optional[str] = None
+    line_items: list[LineItem] = []
+    street_line: Optional[int] = None
+
+    for index, raw_line in enumerate(ocr_text.split("\n")):
+        line = raw_line.strip()
+        if not line:
+            continue
 
-    # Extract merchant name (usually first non-empty line)
-    merchant_name = None
-    for line in lines[:5]:  # Check first 5 lines
-        line = line.strip()
-        if line and len(line) > 2 and not re.match(r"^\d+[/-]\d+", line):  # Not a date
+        # Merchant name: first meaningful line among the first five
+        if merchant_name is None and index < 5 and len(line) > 2 and not _LEADING_DATE_RE.match(line):
             merchant_name = line
-            break
-
-    # Extract date patterns
-    purchase_date = None
-    date_patterns = [
-        r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # MM/DD/YYYY or DD/MM/YYYY
-        r"(\d{4}[/-]\d{1,2}[/-]\d{1,2})",  # YYYY-MM-DD
-    ]
-    for pattern in date_patterns:
-        match = re.search(pattern, ocr_text)
-        if match:
-            purchase_date = match.group(1)
-            break
-
-    # Extract totals (look for "total", "amount", etc.)
-    total = None
-    subtotal = None
-    tax = None
-
-    # Look for total patterns
-    total_patterns = [
-        r"total[:\s]*\$?([\d,]+\.?\d*)",
-        r"amount[:\s]*\$?([\d,]+\.?\d*)",
-        r"grand\s+total[:\s]*\$?([\d,]+\.?\d*)",
-    ]
-    for pattern in total_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                total = float(match.group(1).replace(",", ""))
-                break
-            except ValueError:
-                pass
-
-    # Look for subtotal
-    subtotal_match = re.search(r"subtotal[:\s]*\$?([\d,]+\.?\d*)", text, re.IGNORECASE)
-    if subtotal_match:
-        try:
-            subtotal = float(subtotal_match.group(1).replace(",", ""))
-        except ValueError:
-            pass
-
-    # Look for tax
-    tax_match = re.search(r"tax[:\s]*\$?([\d,]+\.?\d*)", text, re.IGNORECASE)
-    if tax_match:
-        try:
-            tax = float(tax_match.group(1).replace(",", ""))
-        except ValueError:
-            pass
-
-    # Extract line items (lines with prices)
-    line_items: list[LineItem] = []
-    price_pattern = r"\$?([\d,]+\.?\d{2})"
-    
-    for line in lines:
-        line = line.strip()
-        if not line or len(line) < 3:
             continue
-        
-        # Look for lines that might be items (contain price at end)
-        price_match = re.search(rf"{price_pattern}\s*$", line)
-        if price_match:
-            try:
-                price = float(price_match.group(1).replace(",", ""))
-                # Remove price from description
-                description = re.sub(rf"{price_pattern}\s*$", "", line).strip()
-                if description and price > 0:
-                    line_items.append(
-                        LineItem(
-                            description=description,
-                            quantity=None,
-                            unit_price=None,
-                            total=price,
-                        )
-                    )
-            except (ValueError, IndexError):
-                pass
-
-    # Extract payment method
-    payment_method = None
-    payment_keywords = {
-        "cash": "Cash",
-        "credit": "Credit Card",
-        "debit": "Debit Card",
-        "visa": "Visa",
-        "mastercard": "Mastercard",
-        "amex": "American Express",
-        "paypal": "PayPal",
-    }
-    for keyword, method in payment_keywords.items():
-        if keyword in text:
-            payment_method = method
-            break
-
-    # Extract address (look for common address patterns)
-    merchant_address = None
-    address_pattern = r"(\d+\s+[\w\s]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln)[\w\s,]*\d{5})"
-    address_match = re.search(address_pattern, ocr_text, re.IGNORECASE)
-    if address_match:
-        merchant_address = address_match.group(1).strip()
+
+        if purchase_date is None:
+            date_match = _DATE_RE.search(line)
+            if date_match:
+                purchase_date = date_match.group(1)
+                continue
+
+        # Address: a street line near the top, optionally followed by "City, ST 12345"
+        if street_line is None and index < 8 and _STREET_RE.match(line):
+            street_line = index
+            merchant_address = line
+            continue
+        if street_line is not None and index == street_line + 1 and _LOCALITY_RE.match(line):
+            merchant_address = f"{merchant_address}, {line}"
+            continue
+
+        for payment_match in _PAYMENT_RE.finditer(line):
+            keyword = _WHITESPACE_RE.sub("", payment_match.group(1).lower())
+            if payment_keyword is None or _PAYMENT_PRIORITY[keyword] < _PAYMENT_PRIORITY[payment_keyword]:
+                payment_keyword = keyword
+
+        summary = _SUMMARY_RE.search(line)
+        if summary:
+            amount_match = _LABELED_AMOUNT_RE.match(line)
+            amount = _to_float(amount_match.group("amount")) if amount_match else None
+            if amount is None:
+                continue
+            if summary.group("subtotal"):
+                subtotal = subtotal if subtotal is not None else amount
+            elif summary.group("grand_total"):
+                grand_total = grand_total if grand_total is not None else amount
+            elif summary.group("total"):
+                total = total if total is not None else amount
+            elif tax is None:
+                tax = amount
+            continue
+
+        amount_match = _TRAILING_AMOUNT_RE.match(line)
+        if amount_match is None or len(line) < 3 or _NON_ITEM_RE.search(line):
+            continue
+        price = _to_float(amount_match.group("amount"))
+        description = amount_match.group("label").strip()
+        if not description or not price or price <= 0 or len(line_items) >= MAX_LINE_ITEMS:
+            continue
+
+        quantity: Optional[float] = None
+        unit_price: Optional[float] = None
+        quantity_match = _QUANTITY_RE.match(description)
+        if quantity_match:
+            description = quantity_match.group("description").strip()
+            quantity = _to_float(quantity_match.group("quantity"))
+            unit_price = _to_float(quantity_match.group("unit_price"))
+        line_items.append(LineItem(description=description, quantity=quantity, unit_price=unit_price, total=price))
 
     return ReceiptData(
         merchant_name=merchant_name,
@@ -129,9 +147,38 @@ def parse_receipt_from_ocr(ocr_text: str) -> ReceiptData:
         purchase_date=purchase_date,
         subtotal=subtotal,
         tax=tax,
-        total=total,
-        payment_method=payment_method,
-        line_items=line_items[:20],  # Limit to 20 items
+        total=grand_total if grand_total is not None else total,
+        payment_method=_PAYMENT_METHODS[payment_keyword] if payment_keyword else None,
+        line_items=line_items,
         currency="RS",
     )
 
+
+def receipt_confidence(receipt: ReceiptData) -> float:
+    """Score from 0 to 1 for how complete and self-consistent a parsed receipt is.
+
+    The arithmetic checks carry most of the weight: OCR that misreads a digit
+    rarely still produces a subtotal, tax and total that add up, or line items
+    that sum to the subtotal.
+    """
+    score = 0.0
+    if receipt.merchant_name:
+        score += 0.1
+    if receipt.purchase_date:
+        score += 0.1
+    if receipt.total is None:
+        # Nothing left to cross-check.
+        return round(score, 3)
+    score += 0.2
+    if receipt.subtotal is not None and _amounts_match(receipt.subtotal + (receipt.tax or 0.0), receipt.total):
+        score += 0.3
+    items_total = sum(item.total or 0.0 for item in receipt.line_items)
+    expected = receipt.subtotal if receipt.subtotal is not None else receipt.total
+    if receipt.line_items and _amounts_match(items_total, expected):
+        score += 0.3
+    return round(score, 3)
+
+
+def parse_receipts_from_ocr(ocr_texts: Iterable[str]) -> list[ReceiptData]:
+    """Parse many OCR texts at once, in input order."""
+    return [parse_receipt_from_ocr(text) for text in ocr_texts]
@@ -0,0 +1,105 @@
+"""PDF rasterization and merging of per-page receipt analyses."""
+
+from __future__ import annotations
+
+import functools
+import io
+import threading
+from typing import Any, Iterator, Optional
+
+from app.schemas.analyze import AnalyzeResponse, LineItem, ReceiptData
+
+PDF_MIME_TYPE = "application/pdf"
+PAGE_MIME_TYPE = "image/png"
+
+# Fields that describe the document as a whole: the first page that has them wins.
+_HEADER_FIELDS = ("merchant_name", "merchant_address", "purchase_date", "payment_method", "currency")
+# Totals are printed at the end of multi-page invoices: the last page that has them wins.
+_SUMMARY_FIELDS = ("subtotal", "tax", "total")
+
+# pdfium is not thread-safe, even across different documents: every call into it holds this lock.
+_PDFIUM_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _pdfium() -> Any:
+    # Loading the pdfium shared library is slow, so wait for the first PDF.
+    try:  # pragma: no cover - optional dependency
+        import pypdfium2
+    except Exception:  # pragma: no cover - when pdfium missing
+        return None
+    return pypdfium2
+
+
+def pdf_available() -> bool:
+    return _pdfium() is not None
+
+
+def iter_pdf_pages(data: bytes, *, dpi: int, max_pages: int) -> Iterator[bytes]:
+    """Yield each page as a grayscale PNG, rendering one page at a time.
+
+    Every pdfium call, including closing the document when the generator is
+    closed, takes a process-wide lock, so call this from worker threads rather
+    than the event loop. PNG encoding happens outside the lock.
+    """
+
+    pdfium = _pdfium()
+    if pdfium is None:
+        raise RuntimeError("PDF support requires pypdfium2")
+    with _PDFIUM_LOCK:
+        document = pdfium.PdfDocument(data)
+        page_count = min(len(document), max_pages)
+    try:
+        for index in range(page_count):
+            with _PDFIUM_LOCK:
+                page = document[index]
+                try:
+                    bitmap = page.render(scale=dpi / 72, grayscale=True)
+                    # The PIL image shares the bitmap's buffer; copy it so the bitmap can be freed under the lock.
+                    image = bitmap.to_pil().copy()
+                    bitmap.close()
+                finally:
+                    page.close()
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            yield buffer.getvalue()
+    finally:
+        with _PDFIUM_LOCK:
+            document.close()
+
+
+def merge_page_results(pages: list[AnalyzeResponse]) -> AnalyzeResponse:
+    """Combine per-page analyses (in page order) into a single document result."""
+
+    parsed_pages = [page.parsed for page in pages if page.parsed is not None]
+    merged: Optional[ReceiptData] = None
+    if parsed_pages:
+        fields: dict[str, object] = {}
+        for name in _HEADER_FIELDS:
+            fields[name] = next((getattr(p, name) for p in parsed_pages if getattr(p, name) is not None), None)
+        for name in _SUMMARY_FIELDS:
+            fields[name] = next(
+                (getattr(p, name) for p in reversed(parsed_pages) if getattr(p, name) is not None), None
+            )
+        line_items: list[LineItem] = [item for p in parsed_pages for item in p.line_items]
+        additional_fields: dict[str, object] = {}
+        for p in parsed_pages:
+            for key, value in p.additional_fields.items():
+                additional_fields.setdefault(key, value)
+        additional_fields["page_count"] = len(pages)
+        merged = ReceiptData(**fields, line_items=line_items, additional_fields=additional_fields)
+
+    raw_texts = [page.raw_text for page in pages if page.raw_text]
+    ocr_texts = [page.ocr_text or "" for page in pages]
+    warnings = [
+        f"Page {number}: {warning}" for number, page in enumerate(pages, start=1) for warning in page.warnings
+    ]
+    tiers = {page.tier for page in pages if page.tier is not None}
+    return AnalyzeResponse(
+        parsed=merged,
+        raw_text="\n".join(raw_texts) if raw_texts else None,
+        # Form feed is the conventional OCR page separator.
+        ocr_text="\f".join(ocr_texts) if any(ocr_texts) else None,
+        warnings=warnings,
+        tier=tiers.pop() if len(tiers) == 1 else ("mixed" if tiers else None),
+    )
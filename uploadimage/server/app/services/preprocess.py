@@ -0,0 +1,131 @@
+"""Image preprocessing that shrinks uploads before they are sent to the LLM."""
+
+from __future__ import annotations
+
+import functools
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Optional
+
+from app.core.config import get_settings
+from app.services.near_duplicates import dhash
+
+logger = logging.getLogger(__name__)
+
+_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _pillow() -> Optional[tuple[ModuleType, ModuleType]]:
+    # Imported on first use so that importing the app stays cheap.
+    try:  # pragma: no cover - optional dependency
+        from PIL import Image, ImageOps
+    except Exception:  # pragma: no cover - when Pillow missing
+        return None
+    return Image, ImageOps
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    original_size: int
+    # Seconds spent in each stage (decode, transform, encode).
+    timings: dict[str, float] = field(default_factory=dict)
+    # Perceptual hash of the decoded image, when near-duplicate reuse is enabled.
+    fingerprint: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class ImagePreprocessor:
+    def __init__(self) -> None:
+        self._settings = get_settings()
+        self._enabled = self._settings.enable_preprocessing and _pillow() is not None
+        self._fingerprint = self._settings.enable_near_duplicate_reuse
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def signature(self) -> str:
+        """Identifies the output-affecting options, for use in cache keys."""
+
+        if not self._enabled:
+            return "original"
+        s = self._settings
+        return f"{s.preprocess_format}:{s.preprocess_max_edge}:{int(s.preprocess_grayscale)}:{s.preprocess_quality}"
+
+    def process(self, *, image_bytes: bytes, mime_type: str) -> PreprocessedImage:
+        original = PreprocessedImage(data=image_bytes, mime_type=mime_type, original_size=len(image_bytes))
+        if not self._enabled or not mime_type.startswith("image/"):
+            return original
+
+        Image, ImageOps = _pillow()  # type: ignore[misc]  # checked by _enabled
+        max_edge = self._settings.preprocess_max_edge
+        pil_format, out_mime = _FORMATS[self._settings.preprocess_format]
+        timings: dict[str, float] = {}
+
+        started = time.perf_counter()
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            # Let the JPEG decoder scale down while decoding instead of after.
+            image.draft("L" if self._settings.preprocess_grayscale else "RGB", (max_edge, max_edge))
+            image.load()
+        except Exception:  # pragma: no cover - leave undecodable uploads to the provider
+            return original
+        timings["decode"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        image = ImageOps.exif_transpose(image)
+        # Hash the already decoded, upright image rather than decoding the upload again later.
+        fingerprint = dhash(image) if self._fingerprint else None
+        if max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if self._settings.preprocess_grayscale:
+            image = image.convert("L")
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        timings["transform"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        save_kwargs = {"optimize": True}
+        if pil_format != "PNG":
+            save_kwargs["quality"] = self._settings.preprocess_quality
+        image.save(buffer, format=pil_format, **save_kwargs)
+        timings["encode"] = time.perf_counter() - started
+
+        result = PreprocessedImage(
+            data=buffer.getvalue(),
+            mime_type=out_mime,
+            original_size=len(image_bytes),
+            timings=timings,
+            fingerprint=fingerprint,
+        )
+        if result.size >= original.size:
+            # Already compact (small PNG screenshots, say): keep the original bytes.
+            original.timings = timings
+            original.fingerprint = fingerprint
+            result = original
+
+        logger.debug(
+            "Preprocessed %s upload: %d -> %d bytes (decode %.1f ms, transform %.1f ms, encode %.1f ms)",
+            mime_type,
+            result.original_size,
+            result.size,
+            timings["decode"] * 1000,
+            timings["transform"] * 1000,
+            timings["encode"] * 1000,
+        )
+        return result
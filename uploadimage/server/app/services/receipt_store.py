@@ -0,0 +1,309 @@
+"""Analyzed receipts persisted in SQLite, with line-item search and incrementally maintained spending totals."""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from app.schemas.analyze import ReceiptData
+from app.schemas.receipts import SpendingDimension, SpendingTotal, StoredReceipt
+
+# Unknown merchants, months and payment methods are stored under '' so they still have a totals row.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    merchant_name TEXT,
+    merchant_key TEXT NOT NULL,
+    purchase_date TEXT,
+    month TEXT NOT NULL,
+    total REAL,
+    payment_method TEXT,
+    payment_key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    tier TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipts_merchant ON receipts (merchant_key, purchase_date);
+CREATE INDEX IF NOT EXISTS receipts_date ON receipts (purchase_date);
+CREATE INDEX IF NOT EXISTS receipts_total ON receipts (total);
+
+CREATE TABLE IF NOT EXISTS line_items (
+    id INTEGER PRIMARY KEY,
+    receipt_id INTEGER NOT NULL REFERENCES receipts (id) ON DELETE CASCADE,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS line_items_receipt ON line_items (receipt_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS line_items_fts USING fts5(
+    description, content='line_items', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS line_items_insert AFTER INSERT ON line_items BEGIN
+    INSERT INTO line_items_fts (rowid, description) VALUES (new.id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS line_items_delete AFTER DELETE ON line_items BEGIN
+    INSERT INTO line_items_fts (line_items_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END;
+
+CREATE TABLE IF NOT EXISTS spending_totals (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    label TEXT,
+    receipt_count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (dimension, key, currency)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS receipts_insert AFTER INSERT ON receipts BEGIN
+    INSERT INTO spending_totals (dimension, key, currency, label, receipt_count, total)
+    VALUES
+        ('merchant', new.merchant_key, new.currency, new.merchant_name, 1, COALESCE(new.total, 0)),
+        ('month', new.month, new.currency, NULLIF(new.month, ''), 1, COALESCE(new.total, 0)),
+        ('payment_method', new.payment_key, new.currency, new.payment_method, 1, COALESCE(new.total, 0))
+    ON CONFLICT DO UPDATE SET
+        receipt_count = receipt_count + 1,
+        total = total + excluded.total,
+        label = COALESCE(excluded.label, label);
+END;
+CREATE TRIGGER IF NOT EXISTS receipts_delete AFTER DELETE ON receipts BEGIN
+    UPDATE spending_totals
+    SET receipt_count = receipt_count - 1, total = total - COALESCE(old.total, 0)
+    WHERE currency = old.currency AND (
+        (dimension = 'merchant' AND key = old.merchant_key)
+        OR (dimension = 'month' AND key = old.month)
+        OR (dimension = 'payment_method' AND key = old.payment_key)
+    );
+    DELETE FROM spending_totals WHERE currency = old.currency AND receipt_count <= 0;
+END;
+"""
+
+_BUSY_TIMEOUT_SECONDS = 5.0
+
+_ISO_DATE_RE = re.compile(r"(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})")
+_NUMERIC_DATE_RE = re.compile(r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})")
+_TEXT_DATE_FORMATS = ("%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y", "%d-%b-%Y", "%d-%b-%y")
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Grouping key for merchants and payment methods: case- and whitespace-insensitive."""
+
+    return " ".join(value.split()).casefold() if value else ""
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """``purchase_date`` as ``YYYY-MM-DD``, or None when it can't be read.
+
+    Numeric dates are read day first (``05/03/2024`` is 5 March) unless only
+    month-first is valid; two-digit years are taken as 20xx.
+    """
+
+    if not value:
+        return None
+    text = value.strip()
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        return _valid_date(year, month, day)
+    match = _NUMERIC_DATE_RE.search(text)
+    if match:
+        first, second, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+        return _valid_date(year, second, first) or _valid_date(year, first, second)
+    cleaned = " ".join(text.replace(",", " ").split())
+    for fmt in _TEXT_DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _match_query(text: str) -> Optional[str]:
+    """An FTS5 query matching every word of ``text`` as a prefix; user syntax is never interpreted."""
+
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+class ReceiptStore:
+    """SQLite store for analyzed receipts, keyed by the SHA-256 of the upload.
+
+    Saving the same upload again replaces the earlier row. Per merchant, month
+    and payment method totals are kept up to date by triggers inside the same
+    transaction as each insert or delete, so summaries never scan receipts.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def save(self, sha256: str, receipt: ReceiptData, *, tier: Optional[str] = None) -> int:
+        """Insert the receipt for an upload, or replace it keeping its id, and return the id."""
+
+        iso_date = normalize_date(receipt.purchase_date)
+        row = (
+            sha256,
+            receipt.merchant_name,
+            normalize_key(receipt.merchant_name),
+            iso_date,
+            iso_date[:7] if iso_date else "",
+            receipt.total,
+            receipt.payment_method,
+            normalize_key(receipt.payment_method),
+            (receipt.currency or "").strip().upper(),
+            tier,
+            receipt.model_dump_json(),
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Delete and re-insert rather than update, so the triggers move the old totals out.
+                existing = self._conn.execute(
+                    "DELETE FROM receipts WHERE sha256 = ? RETURNING id", (sha256,)
+                ).fetchone()
+                receipt_id = self._conn.execute(
+                    "INSERT INTO receipts (id, sha256, merchant_name, merchant_key, purchase_date, month, total,"
+                    " payment_method, payment_key, currency, tier, data, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (existing["id"] if existing else None, *row),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO line_items (receipt_id, description) VALUES (?, ?)",
+                    [(receipt_id, item.description) for item in receipt.line_items if item.description],
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return int(receipt_id)
+
+    def get(self, receipt_id: int) -> Optional[StoredReceipt]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, sha256, created_at, tier, purchase_date, data FROM receipts WHERE id = ?", (receipt_id,)
+            ).fetchone()
+        return _stored(row) if row else None
+
+    def delete(self, receipt_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM receipts WHERE id = ?", (receipt_id,)).rowcount > 0
+
+    def search(
+        self,
+        *,
+        query: Optional[str] = None,
+        merchant: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        min_total: Optional[float] = None,
+        max_total: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[StoredReceipt]:
+        """Receipts matching every given filter, newest purchase first.
+
+        ``query`` matches line-item descriptions (word prefixes, all words
+        required); ``merchant`` matches the merchant name ignoring case.
+        """
+
+        clauses: list[str] = []
+        params: list[Any] = []
+        if query is not None:
+            match = _match_query(query)
+            if match is None:
+                return []
+            clauses.append(
+                "id IN (SELECT receipt_id FROM line_items WHERE id IN"
+                " (SELECT rowid FROM line_items_fts WHERE line_items_fts MATCH ?))"
+            )
+            params.append(match)
+        if merchant is not None:
+            clauses.append("merchant_key = ?")
+            params.append(normalize_key(merchant))
+        if date_from is not None:
+            clauses.append("purchase_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("purchase_date <= ?")
+            params.append(date_to)
+        if min_total is not None:
+            clauses.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            clauses.append("total <= ?")
+            params.append(max_total)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, sha256, created_at, tier, purchase_date, data FROM receipts {where}"
+                " ORDER BY purchase_date DESC NULLS LAST, id DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [_stored(row) for row in rows]
+
+    def totals(
+        self, dimension: SpendingDimension, *, currency: Optional[str] = None, limit: int = 100
+    ) -> list[SpendingTotal]:
+        """Precomputed totals for one dimension: months in order, merchants and payment methods by spend."""
+
+        order = "key DESC" if dimension == "month" else "total DESC, key"
+        clauses = ["dimension = ?"]
+        params: list[Any] = [dimension]
+        if currency is not None:
+            clauses.append("currency = ?")
+            params.append(currency.strip().upper())
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dimension, key, currency, label, receipt_count, total FROM spending_totals"
+                f" WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [
+            SpendingTotal(
+                dimension=row["dimension"],
+                key=row["key"] or None,
+                label=row["label"],
+                currency=row["currency"],
+                receipt_count=row["receipt_count"],
+                # Totals are adjusted by repeated float additions; report them at cent precision.
+                total=round(row["total"], 2),
+            )
+            for row in rows
+        ]
+
+
+def _stored(row: sqlite3.Row) -> StoredReceipt:
+    return StoredReceipt(
+        id=row["id"],
+        sha256=row["sha256"],
+        created_at=row["created_at"],
+        tier=row["tier"],
+        date=row["purchase_date"],
+        receipt=ReceiptData.model_validate_json(row["data"]),
+    )
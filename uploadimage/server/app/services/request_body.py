@@ -0,0 +1,46 @@
+"""Provider request bodies that base64-encode the image while streaming instead of building the JSON in memory."""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, AsyncIterator
+
+# Stands in for the base64 image inside the payload; never valid in real JSON text.
+IMAGE_PLACEHOLDER = "\x00image\x00"
+
+# Multiples of 3 input bytes encode to whole base64 quanta, so chunks concatenate cleanly.
+_CHUNK_BYTES = 3 * 64 * 1024
+
+
+class StreamedJSONBody:
+    """``payload`` serialized as JSON, with ``IMAGE_PLACEHOLDER`` replaced by base64 of ``data``.
+
+    Only the small JSON skeleton around the image is serialized up front. The
+    image is encoded 192 KB at a time from a memoryview while the request is
+    being sent, so neither the base64 text nor the full JSON body is ever held
+    in memory. ``len()`` is exact, so requests carry a Content-Length instead
+    of using chunked transfer encoding.
+    """
+
+    def __init__(self, payload: dict[str, Any], data: bytes) -> None:
+        text = json.dumps(payload)
+        prefix, found, suffix = text.partition(json.dumps(IMAGE_PLACEHOLDER)[1:-1])
+        if not found:  # pragma: no cover - programming error
+            raise ValueError("payload does not contain IMAGE_PLACEHOLDER")
+        self._prefix = prefix.encode("utf-8")
+        self._suffix = suffix.encode("utf-8")
+        self._data = memoryview(data)
+
+    def __len__(self) -> int:
+        return len(self._prefix) + 4 * -(-len(self._data) // 3) + len(self._suffix)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Content-Type": "application/json", "Content-Length": str(len(self))}
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._prefix
+        for start in range(0, len(self._data), _CHUNK_BYTES):
+            yield base64.b64encode(self._data[start : start + _CHUNK_BYTES])
+        yield self._suffix
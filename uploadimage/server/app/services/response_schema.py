@@ -0,0 +1,103 @@
+"""Response schemas for provider-native structured output, generated from the Pydantic models."""
+
+from __future__ import annotations
+
+import functools
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+# Documentation-only keywords: they cost prompt tokens and some providers reject them.
+_DROPPED_KEYS = {"title", "default", "examples"}
+
+
+@functools.lru_cache(maxsize=None)
+def json_response_schema(model: type[BaseModel]) -> dict[str, Any]:
+    """Self-contained JSON Schema for ``model``, with ``$ref``s inlined (OpenAI-style ``response_format``)."""
+
+    schema = model.model_json_schema()
+    return _inline(schema, schema.get("$defs", {}))
+
+
+@functools.lru_cache(maxsize=None)
+def gemini_response_schema(model: type[BaseModel]) -> dict[str, Any]:
+    """``model`` as the OpenAPI subset accepted by Gemini's ``responseSchema``.
+
+    Optional fields become ``nullable`` and stay out of ``required``, so the model
+    can omit them instead of spelling out nulls. Free-form objects (such as
+    ``additional_fields``) cannot be expressed and are left out.
+    """
+
+    schema = model.model_json_schema()
+    converted = _to_gemini(schema, schema.get("$defs", {}))
+    if converted is None:  # pragma: no cover - programming error
+        raise ValueError(f"{model.__name__} cannot be expressed as a Gemini response schema")
+    return converted
+
+
+def _resolve(node: dict[str, Any], defs: dict[str, Any]) -> dict[str, Any]:
+    ref = node.get("$ref")
+    if ref is None:
+        return node
+    return {**defs[ref.rsplit("/", 1)[-1]], **{k: v for k, v in node.items() if k != "$ref"}}
+
+
+def _inline(node: Any, defs: dict[str, Any]) -> Any:
+    if isinstance(node, list):
+        return [_inline(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    node = _resolve(node, defs)
+    return {
+        key: _inline_properties(value, defs) if key == "properties" else _inline(value, defs)
+        for key, value in node.items()
+        if key not in _DROPPED_KEYS and key != "$defs"
+    }
+
+
+def _inline_properties(properties: dict[str, Any], defs: dict[str, Any]) -> dict[str, Any]:
+    # Property names may collide with dropped keywords ("title", "default"), so map them separately.
+    return {name: _inline(value, defs) for name, value in properties.items()}
+
+
+def _to_gemini(node: dict[str, Any], defs: dict[str, Any]) -> Optional[dict[str, Any]]:
+    node = _resolve(node, defs)
+    nullable = False
+    variants = node.get("anyOf")
+    if variants is not None:
+        options = [variant for variant in variants if variant.get("type") != "null"]
+        if len(options) != 1:
+            return None
+        nullable = len(options) < len(variants)
+        outer = {k: v for k, v in node.items() if k != "anyOf"}
+        node = {**_resolve(options[0], defs), **outer}
+
+    kind = node.get("type")
+    if kind == "object":
+        properties: dict[str, Any] = {}
+        for name, prop in node.get("properties", {}).items():
+            converted = _to_gemini(prop, defs)
+            if converted is not None:
+                properties[name] = converted
+        if not properties:
+            return None
+        result: dict[str, Any] = {"type": "OBJECT", "properties": properties, "propertyOrdering": list(properties)}
+        required = [name for name in node.get("required", []) if name in properties]
+        if required:
+            result["required"] = required
+    elif kind == "array":
+        items = _to_gemini(node.get("items", {}), defs)
+        if items is None:
+            return None
+        result = {"type": "ARRAY", "items": items}
+    elif kind in ("string", "number", "integer", "boolean"):
+        result = {"type": kind.upper()}
+    else:
+        return None
+
+    for key in ("description", "enum", "format"):
+        if key in node:
+            result[key] = node[key]
+    if nullable:
+        result["nullable"] = True
+    return result
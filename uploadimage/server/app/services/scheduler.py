@@ -0,0 +1,204 @@
+"""Quota-aware scheduling of LLM calls across an ordered list of models."""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import re
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Mapping, Optional, Protocol, TypeVar
+
+from app.services.metrics import FALLBACKS, RATE_LIMITED
+from app.services.shared_state import SharedStateStore, record_unavailable
+
+T = TypeVar("T")
+
+_RETRY_DELAY_RE = re.compile(r"^(\d+(?:\.\d+)?)s$")
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when a provider rejects a call with 429 / quota exhausted."""
+
+    def __init__(self, message: str, *, model: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.model = model
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers: Mapping[str, str], body: Any = None) -> Optional[float]:
+    """Extract a retry hint in seconds from a Retry-After header or a Google RetryInfo detail."""
+
+    header = headers.get("retry-after")
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(header)
+            if parsed is not None:
+                return max(parsed.timestamp() - time.time(), 0.0)
+
+    if isinstance(body, list) and body:
+        body = body[0]
+    details = (body or {}).get("error", {}).get("details", []) if isinstance(body, dict) else []
+    for detail in details:
+        if isinstance(detail, dict) and detail.get("@type", "").endswith("google.rpc.RetryInfo"):
+            match = _RETRY_DELAY_RE.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class Bucket(Protocol):
+    async def wait_time(self) -> float: ...
+
+    async def try_acquire(self) -> bool: ...
+
+    async def block_for(self, seconds: float) -> None: ...
+
+
+class TokenBucket:
+    """Classic token bucket, plus a hard block used to honour provider reset hints."""
+
+    def __init__(self, *, rate_per_minute: float, burst: int) -> None:
+        self._rate = rate_per_minute / 60.0
+        self._capacity = float(max(burst, 1))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self._rate > 0:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _wait(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        if self._rate <= 0:
+            return max(self._blocked_until - now, 0.0)
+        shortfall = max(1.0 - self._tokens, 0.0) / self._rate
+        return max(self._blocked_until - now, shortfall, 0.0)
+
+    async def wait_time(self) -> float:
+        """Seconds until a token can be taken (0 when one is available now)."""
+
+        return self._wait()
+
+    async def try_acquire(self) -> bool:
+        if self._wait() > 0:
+            return False
+        if self._rate > 0:
+            self._tokens -= 1.0
+        return True
+
+    async def block_for(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class SharedTokenBucket:
+    """``TokenBucket`` whose state lives in a ``SharedStateStore``.
+
+    Store calls run in a worker thread. While the database is locked the bucket
+    falls back to a per-process ``TokenBucket`` rather than failing the call.
+    """
+
+    def __init__(self, store: SharedStateStore, name: str, *, rate_per_minute: float, burst: int) -> None:
+        self._store = store
+        self._name = name
+        self._rate = rate_per_minute / 60.0
+        self._capacity = float(max(burst, 1))
+        self._local = TokenBucket(rate_per_minute=rate_per_minute, burst=burst)
+
+    async def wait_time(self) -> float:
+        try:
+            return await asyncio.to_thread(
+                self._store.peek_wait, self._name, rate=self._rate, capacity=self._capacity
+            )
+        except sqlite3.OperationalError as exc:
+            record_unavailable("rate_peek", exc)
+            return await self._local.wait_time()
+
+    async def try_acquire(self) -> bool:
+        try:
+            wait = await asyncio.to_thread(self._store.take_token, self._name, rate=self._rate, capacity=self._capacity)
+        except sqlite3.OperationalError as exc:
+            record_unavailable("rate_take", exc)
+            return await self._local.try_acquire()
+        return wait == 0
+
+    async def block_for(self, seconds: float) -> None:
+        await self._local.block_for(seconds)
+        try:
+            await asyncio.to_thread(self._store.block, self._name, seconds, capacity=self._capacity)
+        except sqlite3.OperationalError as exc:
+            record_unavailable("rate_block", exc)
+
+
+class ModelScheduler:
+    """Runs a call against the first model with spare capacity, failing over on quota errors.
+
+    Models are tried in priority order. A 429 blocks that model for its
+    Retry-After (or a default cooldown) and moves on to the next one; when no
+    model has capacity the caller queues for up to ``max_wait`` seconds. With a
+    ``store`` the buckets are shared by every worker process on the host.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        *,
+        rate_per_minute: float,
+        burst: int,
+        max_wait: float,
+        default_cooldown: float,
+        store: Optional[SharedStateStore] = None,
+    ) -> None:
+        if not models:
+            raise ValueError("ModelScheduler needs at least one model")
+        self._models = models
+        self._buckets: dict[str, Bucket] = {}
+        for model in models:
+            if store is not None:
+                self._buckets[model] = SharedTokenBucket(
+                    store, f"model:{model}", rate_per_minute=rate_per_minute, burst=burst
+                )
+            else:
+                self._buckets[model] = TokenBucket(rate_per_minute=rate_per_minute, burst=burst)
+        self._max_wait = max_wait
+        self._default_cooldown = default_cooldown
+
+    @property
+    def models(self) -> list[str]:
+        return list(self._models)
+
+    async def run(self, call: Callable[[str], Awaitable[T]]) -> T:
+        deadline = time.monotonic() + self._max_wait
+        last_error: Optional[QuotaExceededError] = None
+        while True:
+            for model in self._models:
+                if not await self._buckets[model].try_acquire():
+                    continue
+                try:
+                    result = await call(model)
+                except QuotaExceededError as exc:
+                    RATE_LIMITED.inc(model=model)
+                    last_error = exc
+                    await self._buckets[model].block_for(
+                        exc.retry_after if exc.retry_after is not None else self._default_cooldown
+                    )
+                    continue
+                if model != self._models[0]:
+                    FALLBACKS.inc(kind="model", target=model)
+                return result
+
+            wait = min([await bucket.wait_time() for bucket in self._buckets.values()])
+            if time.monotonic() + wait > deadline:
+                if last_error is not None:
+                    raise last_error
+                raise QuotaExceededError(
+                    f"No capacity on models {', '.join(self._models)} within {self._max_wait:.0f}s",
+                    model=self._models[0],
+                    retry_after=wait,
+                )
+            await asyncio.sleep(max(wait, 0.01))
@@ -0,0 +1,198 @@
+"""State shared by every worker process on a host, kept in one SQLite database in WAL mode."""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from app.services.metrics import SHARED_STATE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    raw_text TEXT NOT NULL,
+    parsed TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_cache_created ON analysis_cache (created_at);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS near_duplicates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    context TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    raw_text TEXT NOT NULL,
+    parsed TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS near_duplicates_context ON near_duplicates (context, id);
+"""
+
+# Workers wait this long for another worker's write transaction before giving up.
+_BUSY_TIMEOUT_SECONDS = 2.0
+# The cache table is trimmed back to its size limit once per this many puts, not on every insert.
+_CACHE_TRIM_INTERVAL = 100
+
+
+def record_unavailable(operation: str, exc: sqlite3.OperationalError) -> None:
+    """Count and log a shared-state operation that was skipped, typically because the database was locked."""
+
+    SHARED_STATE_ERRORS.inc(operation=operation)
+    logger.warning("Shared state %s skipped: %s", operation, exc)
+
+
+class SharedStateStore:
+    """Analysis results and token buckets visible to all gunicorn workers.
+
+    Every operation is a single short transaction, so WAL readers never block and
+    writers only queue behind each other for microseconds. Times are wall-clock
+    because monotonic clocks are not comparable across processes.
+
+    Methods block on SQLite, so async callers run them with ``asyncio.to_thread``;
+    they raise ``sqlite3.OperationalError`` when another worker holds the write
+    lock for longer than the busy timeout.
+    """
+
+    def __init__(self, path: Path, *, cache_max_entries: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._cache_max_entries = max(cache_max_entries, 0)
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=_BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def cache_get(self, key: str) -> Optional[tuple[str, dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_text, parsed FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], json.loads(row[1])
+        except ValueError:
+            return None
+
+    def cache_put(self, key: str, raw_text: str, parsed: dict[str, Any]) -> None:
+        if self._cache_max_entries == 0:
+            return
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, raw_text, parsed, created_at) VALUES (?, ?, ?, ?)",
+                (key, raw_text, json.dumps(parsed), time.time()),
+            )
+            self._puts += 1
+            if self._puts % _CACHE_TRIM_INTERVAL == 0:
+                conn.execute(
+                    "DELETE FROM analysis_cache WHERE key IN"
+                    " (SELECT key FROM analysis_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self._cache_max_entries,),
+                )
+
+    def near_duplicate_add(
+        self, context: str, fingerprint: str, raw_text: str, parsed: dict[str, Any], *, max_entries: int
+    ) -> None:
+        """Add an entry, keeping at most ``max_entries`` (the newest) for its context."""
+
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO near_duplicates (context, fingerprint, raw_text, parsed) VALUES (?, ?, ?, ?)",
+                (context, fingerprint, raw_text, json.dumps(parsed)),
+            )
+            conn.execute(
+                "DELETE FROM near_duplicates WHERE context = ? AND id <="
+                " (SELECT id FROM near_duplicates WHERE context = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (context, context, max_entries),
+            )
+
+    def near_duplicates_since(self, context: str, last_id: int) -> list[tuple[int, str, str, dict[str, Any]]]:
+        """Entries added (by any worker) after ``last_id``, oldest first."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, fingerprint, raw_text, parsed FROM near_duplicates"
+                " WHERE context = ? AND id > ? ORDER BY id",
+                (context, last_id),
+            ).fetchall()
+        return [(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+
+    def take_token(self, name: str, *, rate: float, capacity: float) -> float:
+        """Refill and, if one is available, take a token. Returns 0 on success, else seconds to wait."""
+
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM rate_buckets WHERE name = ?", (name,)
+            ).fetchone()
+            tokens, wait = _refill(row, now, rate=rate, capacity=capacity)
+            if wait == 0 and rate > 0:
+                tokens -= 1.0
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                (name, tokens, now, row[2] if row else 0.0),
+            )
+        return wait
+
+    def peek_wait(self, name: str, *, rate: float, capacity: float) -> float:
+        """Seconds until ``take_token`` would succeed; a plain read that leaves the bucket untouched."""
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM rate_buckets WHERE name = ?", (name,)
+            ).fetchone()
+        return _refill(row, now, rate=rate, capacity=capacity)[1]
+
+    def block(self, name: str, seconds: float, *, capacity: float) -> None:
+        until = time.time() + seconds
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO rate_buckets (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                (name, capacity, time.time(), until),
+            )
+
+
+def _refill(
+    row: Optional[tuple[float, float, float]], now: float, *, rate: float, capacity: float
+) -> tuple[float, float]:
+    """Tokens in a ``rate_buckets`` row as of ``now``, and the seconds until one can be taken."""
+
+    tokens, updated_at, blocked_until = row if row else (capacity, now, 0.0)
+    if rate > 0:
+        tokens = min(capacity, tokens + max(now - updated_at, 0.0) * rate)
+    wait = max(blocked_until - now, 0.0)
+    if rate > 0:
+        wait = max(wait, max(1.0 - tokens, 0.0) / rate)
+    return tokens, wait
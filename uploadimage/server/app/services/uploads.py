@@ -0,0 +1,152 @@
+"""Incremental reading and validation of uploaded receipts."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import tempfile
+from dataclasses import dataclass
+from typing import IO, Callable, Optional
+
+from fastapi import UploadFile
+
+from app.services.metrics import PAYLOAD_BYTES, timed
+
+CHUNK_SIZE = 64 * 1024
+# Spooled uploads move from memory to a temporary file beyond this size.
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Enough bytes to recognise every signature below.
+SNIFF_BYTES = 16
+
+_SIGNATURES: list[tuple[int, bytes, str]] = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"BM", "image/bmp"),
+    (4, b"ftypheic", "image/heic"),
+    (4, b"ftypheix", "image/heic"),
+    (4, b"ftypmif1", "image/heif"),
+]
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class Upload:
+    data: bytes
+    mime_type: str
+    sha256: str
+    filename: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+@dataclass
+class SpooledUpload:
+    """A validated upload kept in a temporary file until it is needed."""
+
+    file: IO[bytes]
+    size: int
+    mime_type: str
+    sha256: str
+    filename: Optional[str] = None
+
+    def read(self) -> Upload:
+        """Load the contents (blocking file I/O; call from a thread)."""
+
+        self.file.seek(0)
+        return Upload(data=self.file.read(), mime_type=self.mime_type, sha256=self.sha256, filename=self.filename)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """Identify supported formats from their magic bytes instead of the client's content type."""
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for offset, signature, mime_type in _SIGNATURES:
+        if head[offset : offset + len(signature)] == signature:
+            return mime_type
+    return None
+
+
+async def read_upload(file: UploadFile, *, max_bytes: int) -> Upload:
+    """Read an upload in chunks, enforcing the size limit and hashing as bytes arrive.
+
+    Raises UploadRejected as soon as the file is known to be empty, too large
+    or not a supported image/PDF, without buffering the rest of it.
+    """
+
+    # BytesIO.getvalue() hands over its buffer (trimmed in place) instead of copying it,
+    # so unlike bytes(bytearray) the upload never exists twice; callers still get bytes.
+    buffer = io.BytesIO()
+    _, mime_type, sha256 = await _copy_upload(file, max_bytes=max_bytes, write=buffer.write)
+    return Upload(data=buffer.getvalue(), mime_type=mime_type, sha256=sha256, filename=file.filename)
+
+
+async def spool_upload(file: UploadFile, *, max_bytes: int) -> SpooledUpload:
+    """Like ``read_upload``, but copy the contents to a temporary file instead of memory."""
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        size, mime_type, sha256 = await _copy_upload(file, max_bytes=max_bytes, write=spool.write)
+    except BaseException:
+        spool.close()
+        raise
+    return SpooledUpload(file=spool, size=size, mime_type=mime_type, sha256=sha256, filename=file.filename)
+
+
+async def _copy_upload(file: UploadFile, *, max_bytes: int, write: Callable[[bytes], object]) -> tuple[int, str, str]:
+    """Pass an upload's chunks to ``write``, returning its size, sniffed MIME type and SHA-256."""
+
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    mime_type: Optional[str] = None
+    with timed("upload_read"):
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            digest.update(chunk)
+            write(chunk)
+            if mime_type is None:
+                head += chunk[: SNIFF_BYTES - len(head)]
+                if len(head) >= SNIFF_BYTES:
+                    mime_type = _require_supported(head, file.content_type)
+    PAYLOAD_BYTES.inc(size, direction="upload")
+
+    if not size:
+        raise UploadRejected(400, "Uploaded file is empty")
+    if mime_type is None:
+        mime_type = _require_supported(head, file.content_type)
+    return size, mime_type, digest.hexdigest()
+
+
+def _require_supported(head: bytes, declared: Optional[str]) -> str:
+    mime_type = sniff_mime_type(head)
+    if mime_type is None:
+        raise UploadRejected(
+            415,
+            f"Unsupported file content (declared as {declared}). Please upload an image (PNG, JPG) or PDF.",
+        )
+    return mime_type